@@ -0,0 +1,91 @@
+"""JWT authentication that trusts role and version claims instead of loading the user.
+
+Tokens issued by accounts.tokens carry the user's role and auth_version. A
+request is authenticated from those claims alone as long as the version still
+matches the user's current one. Current versions are kept in a per-process
+cache for JWT_USER_CACHE_TTL seconds, so an active user costs one small query
+per process per TTL instead of a full user row on every request.
+
+Changing a user's role or deactivating them bumps auth_version (User.save),
+which drops the cached entry in this process immediately and in the others
+once their entry expires. Tokens issued before the claims existed fall back
+to the stock lookup.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .tokens import ROLE_CLAIM, VERSION_CLAIM
+
+# user id -> (expires at, auth_version, is_active)
+_states = {}
+MAX_ENTRIES = 10000
+
+
+def forget_user(user_id):
+    _states.pop(user_id, None)
+
+
+def _load_state(user_id):
+    User = get_user_model()
+    row = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values_list(
+        'auth_version', 'is_active'
+    ).first()
+    if row is None:
+        _states.pop(user_id, None)
+        return None
+    if len(_states) >= MAX_ENTRIES:
+        _states.clear()
+    ttl = getattr(settings, 'JWT_USER_CACHE_TTL', 30)
+    _states[user_id] = (time.monotonic() + ttl, *row)
+    return row
+
+
+def user_state(user_id):
+    """(auth_version, is_active) for the user, from the cache while it is fresh"""
+    state = _states.get(user_id)
+    if state is None or state[0] < time.monotonic():
+        return _load_state(user_id)
+    return state[1:]
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        if ROLE_CLAIM not in validated_token or VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        version = validated_token[VERSION_CLAIM]
+        state = user_state(user_id)
+        if state is not None and state[0] != version:
+            # Another process may have bumped the version since we cached it
+            state = _load_state(user_id)
+        if state is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        current_version, is_active = state
+        if not is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if current_version != version:
+            raise AuthenticationFailed(_('Token is no longer valid, log in again'), code='token_outdated')
+
+        User = get_user_model()
+        known = {
+            api_settings.USER_ID_FIELD: user_id,
+            'role': validated_token[ROLE_CLAIM],
+            'is_active': True,
+            'auth_version': version,
+        }
+        # A real User with everything else deferred: permissions and foreign
+        # keys work as usual, profile fields load on first access. from_db
+        # takes the values in model field order.
+        field_names = [field.attname for field in User._meta.concrete_fields if field.attname in known]
+        return User.from_db(router.db_for_read(User), field_names, [known[name] for name in field_names])
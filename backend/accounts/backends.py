@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+UserModel = get_user_model()
+
+
+class UsernameOrEmailBackend(ModelBackend):
+    """Log in with a username or an email address
+
+    The user is resolved in a single indexed query and the password is hashed
+    exactly once, whether the login is unknown, wrong or right. check_password
+    rehashes an outdated hash on success, see PASSWORD_HASH_ITERATIONS.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        user = UserModel._default_manager.get_by_login(username)
+        if user is None:
+            # Pay for one hash anyway so unknown logins can't be told apart by timing
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,99 @@
+from decimal import Decimal
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.authentication import ClaimsJWTAuthentication, forget_user
+from accounts.tokens import UserAccessToken
+from requests.models import PurchaseRequest, RequestItem
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare queries and latency per request for plain JWT lookups and claim-based authentication'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Requests per endpoint and mode')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        # Seed inside a transaction that is rolled back
+        with transaction.atomic():
+            users = {
+                role: User.objects.create_user(username=f'auth_bench_{role}', role=role, first_name=role)
+                for role in ['staff', 'approver_1', 'finance']
+            }
+            request = PurchaseRequest.objects.create(
+                title='Auth benchmark request',
+                description='Seeded by benchmark_auth',
+                amount=Decimal('10.00'),
+                created_by=users['staff']
+            )
+            RequestItem.objects.create(purchase_request=request, item_name='Item', price=Decimal('10.00'), quantity=1)
+
+            endpoints = [
+                ('staff', '/api/auth/profile/'),
+                ('staff', '/api/requests/'),
+                ('staff', f'/api/requests/{request.id}/'),
+                ('approver_1', '/api/approvals/pending/'),
+                ('finance', '/api/approved_requests/'),
+            ]
+            modes = [
+                # Token without role/version claims: the user row is loaded every time
+                ('lookup', lambda user: AccessToken.for_user(user), False),
+                ('claims', lambda user: UserAccessToken.for_user(user), False),
+                # Every request misses the version cache, the worst case after TTL expiry
+                ('claims-cold', lambda user: UserAccessToken.for_user(user), True),
+            ]
+
+            self.stdout.write(f"{'role':>12} {'endpoint':<28} {'mode':>12} {'queries':>8} {'ms':>8}")
+            for role, url in endpoints:
+                baseline = None
+                for mode, token_for, cold in modes:
+                    client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {token_for(users[role])}')
+                    client.get(url)
+                    queries, elapsed = 0, 0.0
+                    for _ in range(iterations):
+                        if cold:
+                            forget_user(users[role].id)
+                        with CaptureQueriesContext(connection) as captured:
+                            started = time.perf_counter()
+                            client.get(url)
+                            elapsed += time.perf_counter() - started
+                        queries += len(captured)
+                    per_request = queries / iterations
+                    if baseline is None:
+                        baseline = per_request
+                    saved = f' ({baseline - per_request:+.1f} saved)' if mode != 'lookup' else ''
+                    self.stdout.write(
+                        f'{role:>12} {url:<28} {mode:>12} {per_request:>8.1f} '
+                        f'{elapsed / iterations * 1000:>8.2f}{saved}'
+                    )
+
+            self.stdout.write('')
+            self.stdout.write(f"{'authenticator':<28} {'queries':>8} {'us':>8}")
+            factory = RequestFactory()
+            user = users['staff']
+            for label, authenticator, token in [
+                ('JWTAuthentication', JWTAuthentication(), UserAccessToken.for_user(user)),
+                ('ClaimsJWTAuthentication', ClaimsJWTAuthentication(), UserAccessToken.for_user(user)),
+            ]:
+                http_request = factory.get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+                authenticator.authenticate(http_request)
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    for _ in range(iterations):
+                        authenticator.authenticate(http_request)
+                    elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{label:<28} {len(captured) / iterations:>8.1f} {elapsed / iterations * 1e6:>8.1f}'
+                )
+
+            transaction.set_rollback(True)
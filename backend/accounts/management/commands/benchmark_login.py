@@ -0,0 +1,84 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth import hashers
+from django.contrib.auth.backends import ModelBackend
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+User = get_user_model()
+
+PASSWORD = 'bench-login-123'
+
+
+def legacy_login(identifier, password):
+    """The former LoginSerializer flow: username first, then a second lookup and hash by email"""
+    backend = ModelBackend()
+    user = backend.authenticate(None, username=identifier, password=password)
+    if user is None:
+        try:
+            user_obj = User.objects.get(email=identifier)
+        except User.DoesNotExist:
+            return None
+        user = backend.authenticate(None, username=user_obj.username, password=password)
+    return user
+
+
+def current_login(identifier, password):
+    return authenticate(None, username=identifier, password=password)
+
+
+class Command(BaseCommand):
+    help = 'Measure login latency, queries and password hashes for username, email, wrong and unknown logins'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=5, help='Timed logins per scenario and flow')
+        parser.add_argument(
+            '--hash-iterations',
+            type=int,
+            default=settings.PASSWORD_HASH_ITERATIONS,
+            help='PBKDF2 work factor for the run (PASSWORD_HASH_ITERATIONS)'
+        )
+
+    def handle(self, *args, **options):
+        logins = options['logins']
+        scenarios = [
+            ('username', 'bench_login', PASSWORD),
+            ('email', 'bench.login@example.com', PASSWORD),
+            ('wrong password', 'bench.login@example.com', 'not-the-password'),
+            ('unknown user', 'nobody@example.com', PASSWORD),
+        ]
+        flows = [('legacy', legacy_login), ('backend', current_login)]
+
+        self.stdout.write(f"PBKDF2 iterations: {options['hash_iterations']}")
+        self.stdout.write(f"{'scenario':<16} {'flow':>8} {'queries':>8} {'hashes':>7} {'ms':>9} {'logins/s':>9}")
+
+        # Seed inside a transaction that is rolled back
+        with transaction.atomic(), override_settings(PASSWORD_HASH_ITERATIONS=options['hash_iterations']):
+            user = User.objects.create_user(username='bench_login', email='bench.login@example.com', password=PASSWORD)
+
+            for scenario, identifier, password in scenarios:
+                for flow, login in flows:
+                    # Count PBKDF2 runs without changing what they do
+                    with mock.patch.object(hashers, 'pbkdf2', wraps=hashers.pbkdf2) as pbkdf2, \
+                            CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        for _ in range(logins):
+                            login(identifier, password)
+                        elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f'{scenario:<16} {flow:>8} {len(captured) / logins:>8.1f} {pbkdf2.call_count / logins:>7.1f} '
+                        f'{elapsed / logins * 1000:>9.1f} {logins / elapsed:>9.1f}'
+                    )
+
+            # A hash made at another cost is rewritten once, on the next successful login
+            user.password = hashers.make_password(PASSWORD, hasher=hashers.PBKDF2SHA1PasswordHasher())
+            user.save(update_fields=['password'])
+            current_login('bench_login', PASSWORD)
+            user.refresh_from_db(fields=['password'])
+            self.stdout.write(f"Outdated hash after one login: {user.password.split('$', 2)[:2]}")
+
+            transaction.set_rollback(True)
@@ -104,6 +104,7 @@ class Command(BaseCommand):
                 description=req_data['description'],
                 amount=req_data['amount'],
                 status=req_data['status'],
+                current_level=2 if req_data['status'] == 'approved' else 1,
                 created_by=staff_user,
                 created_at=timezone.now() - timezone.timedelta(days=random.randint(1, 30))
             )
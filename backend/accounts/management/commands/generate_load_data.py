@@ -0,0 +1,259 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+from documents.services.po_generator import render_po
+from requests.models import PurchaseRequest, Approval, RequestItem
+
+User = get_user_model()
+
+PREFIX = 'load_'
+
+ROLE_WEIGHTS = {'staff': 85, 'approver_1': 6, 'approver_2': 4, 'finance': 5}
+
+# (status, current_level, decisions) where decisions are the Approval rows per level
+OUTCOMES = [
+    (('approved', 2, ['approved', 'approved']), 60),
+    (('pending', 1, []), 15),
+    (('pending', 2, ['approved']), 10),
+    (('rejected', 1, ['rejected']), 9),
+    (('rejected', 2, ['approved', 'rejected']), 6),
+]
+
+ITEM_COUNT_WEIGHTS = [30, 25, 15, 10, 7, 5, 3, 2, 2, 1]
+
+WORDS = [
+    'Laptop', 'Monitor', 'Office Chair', 'Desk', 'Printer Paper', 'Toner', 'Software License',
+    'Projector', 'Whiteboard', 'Router', 'Cable', 'Headset', 'Keyboard', 'Webcam', 'Filing Cabinet',
+    'Coffee Machine', 'Training Course', 'Consulting Hours', 'Cloud Credits', 'Safety Boots',
+]
+VENDORS = [
+    'TechCorp Solutions', 'Office Supplies Inc', 'Global Electronics',
+    'Business Services Ltd', 'Digital Solutions', 'Professional Services',
+]
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep the generated dates instead of stamping now()"""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def document_pdf(title, vendor, lines):
+    """Small proforma/receipt in the layout the extractors expect: one "name amount" line per item"""
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    y = 750
+    for line in [vendor, title, '']:
+        pdf.drawString(50, y, line)
+        y -= 18
+    for name, amount in lines:
+        pdf.drawString(50, y, f'{name} {amount}')
+        y -= 15
+    pdf.drawString(50, y - 10, f'Total {sum(amount for _, amount in lines)}')
+    pdf.save()
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = 'Generate a large, realistic dataset for load testing with bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--days', type=int, default=730, help='Spread created_at over this many days')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--pdfs',
+            type=int,
+            default=0,
+            help='Render this many distinct proforma/receipt/PO PDFs and attach them to the requests'
+        )
+        parser.add_argument('--clear', action='store_true', help=f'Delete previously generated {PREFIX}* users and their data')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.now = timezone.now()
+        self.days = options['days']
+
+        existing = User.objects.filter(username__startswith=PREFIX)
+        if options['clear']:
+            deleted, _ = existing.delete()
+            self.stdout.write(f'Deleted {deleted} previously generated rows')
+        elif existing.exists():
+            raise CommandError(f'{PREFIX}* users already exist, pass --clear to regenerate')
+
+        users = self.create_users(options['users'])
+        self.staff = users['staff']
+        self.approvers = {1: users['approver_1'], 2: users['approver_2']}
+        if not self.staff or not all(self.approvers.values()):
+            raise CommandError('--users is too small to get staff and both approver levels')
+        # A few heavy requesters and a long tail, like a real department
+        self.staff_weights = list(accumulate(1 / (rank + 1) ** 0.8 for rank in range(len(self.staff))))
+        self.outcomes, outcome_weights = zip(*OUTCOMES)
+        self.outcome_weights = list(accumulate(outcome_weights))
+        self.item_count_weights = list(accumulate(ITEM_COUNT_WEIGHTS))
+
+        self.files = self.render_pdfs(options['pdfs']) if options['pdfs'] else None
+
+        total = options['requests']
+        batch_size = options['batch_size']
+        created = 0
+        started = time.perf_counter()
+        fields = [
+            PurchaseRequest._meta.get_field('created_at'),
+            PurchaseRequest._meta.get_field('updated_at'),
+            Approval._meta.get_field('timestamp'),
+        ]
+        with explicit_timestamps(*fields):
+            while created < total:
+                size = min(batch_size, total - created)
+                self.create_batch(created, size)
+                created += size
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{created}/{total} requests, {created / elapsed:.0f} requests/s')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(self.staff)} staff, {len(self.approvers[1])}+{len(self.approvers[2])} approvers '
+            f'and {total} requests in {time.perf_counter() - started:.1f}s'
+        ))
+
+    def create_users(self, count):
+        roles = list(ROLE_WEIGHTS)
+        # Hashing once keeps thousands of users cheap, they all log in with "load123"
+        password = make_password('load123')
+        role_of = self.rng.choices(roles, weights=ROLE_WEIGHTS.values(), k=count)
+        # Guarantee every role exists even for tiny --users values
+        for index, role in enumerate(roles[:count]):
+            role_of[index] = role
+
+        created = User.objects.bulk_create([
+            User(
+                username=f'{PREFIX}{role}_{i}',
+                email=f'{PREFIX}{role}_{i}@example.com',
+                first_name=role.replace('_', ' ').title(),
+                last_name=str(i),
+                password=password,
+                role=role,
+            )
+            for i, role in enumerate(role_of)
+        ], batch_size=1000)
+
+        users = {role: [] for role in roles}
+        for user in created:
+            users[user.role].append(user.id)
+        return users
+
+    def render_pdfs(self, count):
+        """A pool of distinct documents, shared by many requests instead of one file per row"""
+        files = {'proforma': [], 'receipt': [], 'po': []}
+        for i in range(count):
+            vendor = self.rng.choice(VENDORS)
+            items = self.random_items()
+            lines = [(name, price * quantity) for name, price, quantity in items]
+            files['proforma'].append(default_storage.save(
+                f'proformas/{PREFIX}{i}.pdf', ContentFile(document_pdf(f'Proforma invoice {i}', vendor, lines))
+            ))
+            files['receipt'].append(default_storage.save(
+                f'receipts/{PREFIX}{i}.pdf', ContentFile(document_pdf(f'Receipt {i}', vendor, lines))
+            ))
+            files['po'].append(default_storage.save(f'purchase_orders/{PREFIX}{i}.pdf', ContentFile(render_po({
+                'po_number': f'PO-LOAD-{i:04d}',
+                'date': self.now.strftime('%Y-%m-%d'),
+                'vendor': vendor,
+                'requested_by': 'Load Test',
+                'amount': str(sum(price * quantity for _, price, quantity in items)),
+                'items': [[name, str(quantity), str(price), str(price * quantity)] for name, price, quantity in items],
+            }))))
+        self.stdout.write(f'Rendered {count} proforma, receipt and PO PDFs')
+        return files
+
+    def random_items(self):
+        rng = self.rng
+        count = rng.choices(range(1, len(ITEM_COUNT_WEIGHTS) + 1), cum_weights=self.item_count_weights)[0]
+        return [
+            (
+                rng.choice(WORDS),
+                # Long-tailed prices: mostly tens to hundreds, the odd big-ticket item
+                Decimal(min(rng.lognormvariate(4.5, 1.2), 50000)).quantize(Decimal('0.01')),
+                rng.choice([1, 1, 1, 1, 2, 2, 3, 5, 10, 20]),
+            )
+            for _ in range(count)
+        ]
+
+    def create_batch(self, offset, size):
+        rng = self.rng
+        requests, rows = [], []
+        for i in range(offset, offset + size):
+            status, level, decisions = rng.choices(self.outcomes, cum_weights=self.outcome_weights)[0]
+            items = self.random_items()
+            created_at = self.now - timedelta(seconds=rng.randint(0, self.days * 86400))
+            decided_at = [created_at + timedelta(hours=rng.randint(1, 72) * (n + 1)) for n in range(len(decisions))]
+
+            request = PurchaseRequest(
+                title=f'{items[0][0]} for team {i % 97}',
+                description=f'Generated load request {i}',
+                amount=sum(price * quantity for _, price, quantity in items),
+                status=status,
+                current_level=level,
+                created_by_id=rng.choices(self.staff, cum_weights=self.staff_weights)[0],
+                created_at=created_at,
+                updated_at=decided_at[-1] if decided_at else created_at,
+            )
+            if self.files:
+                pick = rng.randrange(len(self.files['po']))
+                if rng.random() < 0.7:
+                    request.proforma_file = self.files['proforma'][pick]
+                if status == 'approved':
+                    request.purchase_order_file = self.files['po'][pick]
+                    if rng.random() < 0.5:
+                        request.receipt_file = self.files['receipt'][pick]
+            requests.append(request)
+            rows.append((items, decisions, decided_at))
+
+        with transaction.atomic():
+            PurchaseRequest.objects.bulk_create(requests)
+            RequestItem.objects.bulk_create([
+                RequestItem(purchase_request_id=request.id, item_name=name, price=price, quantity=quantity)
+                for request, (items, _, _) in zip(requests, rows)
+                for name, price, quantity in items
+            ], batch_size=1000)
+
+            approvals = []
+            approved_by = []
+            ApprovedBy = PurchaseRequest.approved_by.through
+            for request, (_, decisions, decided_at) in zip(requests, rows):
+                for level, (decision, timestamp) in enumerate(zip(decisions, decided_at), start=1):
+                    approver_id = rng.choice(self.approvers[level])
+                    approvals.append(Approval(
+                        purchase_request_id=request.id,
+                        approver_id=approver_id,
+                        level=level,
+                        status=decision,
+                        timestamp=timestamp,
+                    ))
+                    if request.status == 'approved':
+                        approved_by.append(ApprovedBy(purchaserequest_id=request.id, user_id=approver_id))
+            Approval.objects.bulk_create(approvals, batch_size=1000)
+            ApprovedBy.objects.bulk_create(approved_by, batch_size=1000)
@@ -1,5 +1,23 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+
+class UserManager(BaseUserManager):
+    def by_login(self, identifier):
+        """Users whose username or email (case-insensitive) is ``identifier``, both via a unique index"""
+        return self.alias(email_lower=Lower('email')).filter(
+            Q(username=identifier) | (Q(email_lower=identifier.lower()) & ~Q(email=''))
+        )
+
+    def get_by_login(self, identifier):
+        """One query. If the identifier is one user's username and another's email, the username wins."""
+        users = list(self.by_login(identifier)[:2])
+        for user in users:
+            if user.username == identifier:
+                return user
+        return users[0] if users else None
 
 
 class User(AbstractUser):
@@ -16,10 +34,56 @@ class User(AbstractUser):
         default='staff',
         help_text="User role in the procurement system"
     )
+    auth_version = models.PositiveIntegerField(
+        default=0,
+        help_text="Bumped when a change invalidates issued access tokens"
+    )
+
+    objects = UserManager()
+
+    # Copied into token claims, changing one bumps auth_version
+    TOKEN_FIELDS = ('role', 'is_active')
 
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        constraints = [
+            # Logins accept an email, so it must identify one user. Blank emails are allowed.
+            models.UniqueConstraint(
+                Lower('email'),
+                condition=~Q(email=''),
+                name='user_email_unique',
+                violation_error_message='A user with this email already exists.'
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.username} ({self.get_role_display()})"
\ No newline at end of file
+        return f"{self.username} ({self.get_role_display()})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored token fields so save() can detect changes
+        loaded = dict(zip(field_names, values))
+        instance._loaded_token_fields = {field: loaded[field] for field in cls.TOKEN_FIELDS if field in loaded}
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_loaded_token_fields', {})
+        if any(getattr(self, field) != value for field, value in loaded.items()):
+            self.auth_version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'auth_version'}
+        super().save(*args, **kwargs)
+        self._loaded_token_fields = {field: getattr(self, field) for field in self.TOKEN_FIELDS}
+        from .authentication import forget_user
+        forget_user(self.pk)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Users built from token claims defer everything but id and role.
+        # Touching one profile field loads all of them in a single query.
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using, fields, from_queryset)
\ No newline at end of file
@@ -23,6 +23,11 @@ class RegisterSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Passwords don't match")
         return attrs
 
+    def validate_email(self, value):
+        if value and User.objects.filter(email__iexact=value).exists():
+            raise serializers.ValidationError('A user with this email already exists.')
+        return value
+
     def create(self, validated_data):
         validated_data.pop('password_confirm')
         user = User.objects.create_user(**validated_data)
@@ -38,17 +43,8 @@ class LoginSerializer(serializers.Serializer):
         password = attrs.get('password')
 
         if username and password:
-            # Try to authenticate with username first
-            user = authenticate(username=username, password=password)
-            if not user:
-                # If not found, try with email
-                try:
-                    from django.contrib.auth import get_user_model
-                    User = get_user_model()
-                    user_obj = User.objects.get(email=username)
-                    user = authenticate(username=user_obj.username, password=password)
-                except User.DoesNotExist:
-                    user = None
+            # UsernameOrEmailBackend accepts either in one lookup
+            user = authenticate(self.context.get('request'), username=username, password=password)
 
             if not user:
                 raise serializers.ValidationError('Invalid credentials')
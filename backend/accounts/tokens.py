@@ -0,0 +1,25 @@
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+ROLE_CLAIM = 'role'
+VERSION_CLAIM = 'ver'
+
+
+def add_user_claims(token, user):
+    """Claims ClaimsJWTAuthentication builds the request user from"""
+    token[ROLE_CLAIM] = user.role
+    token[VERSION_CLAIM] = user.auth_version
+    return token
+
+
+class UserRefreshToken(RefreshToken):
+    """Refresh token whose access tokens, including refreshed ones, carry the user claims"""
+
+    @classmethod
+    def for_user(cls, user):
+        return add_user_claims(super().for_user(user), user)
+
+
+class UserAccessToken(AccessToken):
+    @classmethod
+    def for_user(cls, user):
+        return add_user_claims(super().for_user(user), user)
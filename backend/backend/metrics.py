@@ -0,0 +1,363 @@
+"""Prometheus metrics for the hot paths, served as text at /metrics.
+
+Every thread records into its own shard, a plain dict that only that thread
+writes to, so counting never takes a lock. A scrape sums the shards.
+
+With several processes (gunicorn workers, the document job worker and its
+pool) set METRICS_MULTIPROC_DIR in the environment. Each process then writes
+its totals to ``<pid>.json`` in that directory at most every
+METRICS_FLUSH_INTERVAL seconds and on exit, and a scrape merges all files. The
+directory must be emptied when the service starts; gunicorn.conf.py does that
+and folds the files of exited workers into ``retired.json``. Without the
+directory a scrape only sees the process that answered it.
+"""
+import atexit
+import hmac
+import ipaddress
+import json
+import multiprocessing.util
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+RETIRED = 'retired.json'
+
+# Seconds; requests and document stages from a few ms to a slow OCR
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_metrics = {}
+_local = threading.local()
+_shards = []
+_shards_lock = threading.Lock()
+_flusher = None
+
+
+def _multiproc_dir():
+    path = os.environ.get('METRICS_MULTIPROC_DIR')
+    return Path(path) if path else None
+
+
+def _shard():
+    try:
+        return _local.values
+    except AttributeError:
+        pass
+    values = _local.values = {}
+    # Only taken once per thread
+    with _shards_lock:
+        _shards.append(values)
+    _start_flusher()
+    return values
+
+
+def _reset_after_fork():
+    # The parent's totals are already counted in its own file
+    global _local, _shards_lock, _flusher
+    _local = threading.local()
+    _shards.clear()
+    _shards_lock = threading.Lock()
+    _flusher = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        if name in _metrics:
+            raise ValueError(f'Metric {name} is already registered')
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics[name] = self
+
+    def _key(self, labels):
+        return (self.name, tuple(str(labels[label]) for label in self.labelnames))
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        values = _shard()
+        values[key] = values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        values = _shard()
+        # One slot per bucket, one for +Inf, then the sum
+        counts = values.get(key)
+        if counts is None:
+            counts = values[key] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+def _merge(totals, key, value):
+    if isinstance(value, list):
+        current = totals.get(key)
+        totals[key] = value if current is None else [a + b for a, b in zip(current, value)]
+    else:
+        totals[key] = totals.get(key, 0) + value
+
+
+def snapshot():
+    """Totals of this process across all threads"""
+    totals = {}
+    with _shards_lock:
+        shards = list(_shards)
+    for shard in shards:
+        # list() and the slice copy run under the GIL, so a writer can't
+        # resize the dict or change a histogram halfway through the copy
+        for key, value in list(shard.items()):
+            _merge(totals, key, value[:] if isinstance(value, list) else value)
+    return totals
+
+
+def _dump(totals):
+    return [[name, list(labels), value] for (name, labels), value in totals.items()]
+
+
+def _load(path, totals):
+    try:
+        with open(path) as f:
+            rows = json.load(f)
+    except (FileNotFoundError, ValueError):
+        # Gone between listing and reading, or being replaced right now
+        return
+    for name, labels, value in rows:
+        _merge(totals, (name, tuple(labels)), value)
+
+
+def _write(directory, filename, totals):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(_dump(totals), f)
+    os.replace(tmp_path, directory / filename)
+
+
+def flush():
+    """Write this process's totals to the multiprocess directory"""
+    directory = _multiproc_dir()
+    if directory is None:
+        return
+    totals = snapshot()
+    if totals:
+        _write(directory, f'{os.getpid()}.json', totals)
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is not None or _multiproc_dir() is None:
+        return
+    interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0) if settings.configured else 1.0
+    _flusher = threading.Thread(target=_flush_every, args=(interval,), name='metrics-flush', daemon=True)
+    _flusher.start()
+    # Pool processes leave through os._exit, which skips atexit
+    multiprocessing.util.Finalize(None, flush, exitpriority=10)
+
+
+def _flush_every(interval):
+    last = None
+    while True:
+        time.sleep(interval)
+        totals = snapshot()
+        if totals != last:
+            flush()
+            last = totals
+
+
+atexit.register(flush)
+
+
+def retire(pid):
+    """Fold an exited process's file into retired.json so the directory stays small"""
+    directory = _multiproc_dir()
+    if directory is None or not (directory / f'{pid}.json').exists():
+        return
+    totals = {}
+    _load(directory / RETIRED, totals)
+    _load(directory / f'{pid}.json', totals)
+    _write(directory, RETIRED, totals)
+    os.remove(directory / f'{pid}.json')
+
+
+def clear_multiproc_dir():
+    directory = _multiproc_dir()
+    if directory is None:
+        return
+    directory.mkdir(parents=True, exist_ok=True)
+    for path in directory.glob('*.json'):
+        path.unlink()
+
+
+def collect():
+    """Totals across every process when running in multiprocess mode"""
+    directory = _multiproc_dir()
+    if directory is None:
+        return snapshot()
+    flush()
+    totals = {}
+    for path in directory.glob('*.json'):
+        _load(path, totals)
+    return totals
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(totals, gauges=()):
+    """Prometheus text exposition format"""
+    by_metric = {}
+    for (name, labels), value in totals.items():
+        by_metric.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, metric in _metrics.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for labels, value in sorted(by_metric.get(name, [])):
+            if metric.kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip((*metric.buckets, '+Inf'), value):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else repr(float(bound))
+                    lines.append(f'{name}_bucket{_labels(metric.labelnames, labels, [("le", le)])} {cumulative}')
+                lines.append(f'{name}_sum{_labels(metric.labelnames, labels)} {_number(value[-1])}')
+                lines.append(f'{name}_count{_labels(metric.labelnames, labels)} {cumulative}')
+            else:
+                lines.append(f'{name}{_labels(metric.labelnames, labels)} {_number(value)}')
+
+    for name, documentation, labelnames, samples in gauges:
+        lines.append(f'# HELP {name} {documentation}')
+        lines.append(f'# TYPE {name} gauge')
+        for labels, value in samples:
+            lines.append(f'{name}{_labels(labelnames, labels)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Time spent answering a request, by view', ['view', 'method']
+)
+REQUESTS = Counter('http_requests_total', 'Requests answered, by view and status code', ['view', 'method', 'status'])
+EXTRACTION_SECONDS = Histogram(
+    'document_extraction_duration_seconds',
+    'Time spent extracting a proforma or receipt, cache misses only',
+    ['document', 'file_type']
+)
+EXTRACTION_CACHE = Counter(
+    'document_extraction_cache_total', 'Extraction cache lookups, by extractor and result', ['extractor', 'result']
+)
+OCR_PAGES = Counter('document_ocr_pages_total', 'Pages run through OCR', ['document'])
+PO_RENDER_SECONDS = Histogram('purchase_order_render_duration_seconds', 'Time spent rendering a purchase order PDF')
+APPROVAL_TRANSITIONS = Counter(
+    'approval_transitions_total', 'Committed approval decisions, by approval level', ['level', 'decision']
+)
+
+
+def queue_gauges():
+    """Document job queue depth, read from the database at scrape time"""
+    from django.db.models import Count, Min
+    from django.utils import timezone
+    from documents.models import DocumentJob
+
+    rows = DocumentJob.objects.filter(status__in=['queued', 'running']).values('kind', 'status').annotate(
+        jobs=Count('id'), oldest=Min('available_at')
+    )
+    now = timezone.now()
+    depth, age = [], []
+    for row in rows:
+        depth.append(((row['kind'], row['status']), row['jobs']))
+        if row['status'] == 'queued':
+            age.append(((row['kind'],), max((now - row['oldest']).total_seconds(), 0.0)))
+    return [
+        ('document_jobs', 'Queued and running document jobs', ('kind', 'status'), depth),
+        ('document_jobs_oldest_queued_seconds', 'How long the oldest queued job has been due', ('kind',), age),
+    ]
+
+
+def scrape_allowed(request):
+    """Whether the request carries METRICS_TOKEN or comes from METRICS_ALLOWED_IPS"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        sent = request.headers.get('Authorization', '').encode()
+        if hmac.compare_digest(sent, f'Bearer {token}'.encode()):
+            return True
+
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', [])
+    if not allowed:
+        return False
+    try:
+        networks = [ipaddress.ip_network(network, strict=False) for network in allowed]
+    except ValueError as exc:
+        raise ImproperlyConfigured(f'METRICS_ALLOWED_IPS: {exc}')
+    try:
+        # The direct peer: behind a proxy, scrape the app port from the allowed network
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+def metrics_view(request):
+    # Closed unless METRICS_TOKEN or METRICS_ALLOWED_IPS opens it
+    if not scrape_allowed(request):
+        return HttpResponse(status=401 if getattr(settings, 'METRICS_TOKEN', '') else 403)
+    return HttpResponse(render(collect(), queue_gauges()), content_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    """Record latency and status of every request under the resolved view name"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        # Unrouted paths share one label so scanners can't blow up cardinality
+        view = match.view_name if match else 'unmatched'
+        REQUEST_SECONDS.observe(elapsed, view=view, method=request.method)
+        REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        return response
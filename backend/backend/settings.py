@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -51,6 +52,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.metrics.MetricsMiddleware',
+    'backend.timing.ServerTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -89,6 +92,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Take the write lock when atomic() starts, so a transaction that reads
+        # before writing waits for other writers instead of failing with
+        # "database is locked"
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+        # A file rather than the shared-cache in-memory default, whose
+        # concurrent writers fail with "table is locked" instead of waiting;
+        # the approval race tests need the locking production gets
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -111,6 +122,20 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+AUTHENTICATION_BACKENDS = ['accounts.backends.UsernameOrEmailBackend']
+
+# The first hasher is used for new passwords, the others only verify old ones
+PASSWORD_HASHERS = [
+    'accounts.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# PBKDF2 work factor (Django 5.1's default). Existing hashes move to a new value on next login.
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 870000))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -134,6 +159,38 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploaded and generated documents are stored once per distinct content and
+# reference counted, see documents.storage (unreferenced blobs: manage.py gc_blobs)
+STORAGES = {
+    'default': {'BACKEND': 'documents.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Extraction/OCR results cached by file content hash (set to '' to disable)
+DOCUMENT_CACHE_DIR = os.environ.get('DOCUMENT_CACHE_DIR', str(BASE_DIR / 'cache' / 'documents'))
+DOCUMENT_CACHE_MAX_ENTRIES = int(os.environ.get('DOCUMENT_CACHE_MAX_ENTRIES', 10000))
+
+# Minimum trigram similarity (0-1) for a receipt line to match a PO item
+RECEIPT_MATCH_THRESHOLD = float(os.environ.get('RECEIPT_MATCH_THRESHOLD', 0.5))
+
+# Processes used for document work started from web requests (batch receipt validation)
+DOCUMENT_POOL_WORKERS = int(os.environ.get('DOCUMENT_POOL_WORKERS', 2))
+
+# Import pdfplumber, OCR and reportlab when a gunicorn worker or pool process
+# starts instead of on first use (see documents.engines)
+DOCUMENT_ENGINES_WARM_UP = os.environ.get('DOCUMENT_ENGINES_WARM_UP', 'False') == 'True'
+
+# Chunked uploads (POST /api/requests/{id}/uploads/): largest file, and largest
+# chunk accepted per PUT. Chunks are streamed to disk, not held in memory
+DOCUMENT_UPLOAD_MAX_SIZE = int(os.environ.get('DOCUMENT_UPLOAD_MAX_SIZE', 1024 * 1024 * 1024))
+DOCUMENT_UPLOAD_CHUNK_SIZE = int(os.environ.get('DOCUMENT_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+
+# How document downloads leave the app: '' streams them from the worker,
+# 'x-accel-redirect' hands them to nginx, 'x-sendfile' to Apache/lighttpd
+DOCUMENT_DOWNLOAD_OFFLOAD = os.environ.get('DOCUMENT_DOWNLOAD_OFFLOAD', '')
+# nginx `internal` location aliased to MEDIA_ROOT, used with x-accel-redirect
+DOCUMENT_DOWNLOAD_ACCEL_PREFIX = os.environ.get('DOCUMENT_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -145,7 +202,7 @@ AUTH_USER_MODEL = 'accounts.User'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -157,9 +214,46 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# Raise instead of logging when a view goes over its SQL query budget
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', str(DEBUG)) == 'True'
+
+# Fraction of requests that get a Server-Timing header and a timing log line
+SERVER_TIMING_SAMPLE_RATE = float(os.environ.get('SERVER_TIMING_SAMPLE_RATE', 1.0 if DEBUG else 0.05))
+
+# /metrics answers scrapes carrying "Authorization: Bearer <METRICS_TOKEN>" or
+# coming from METRICS_ALLOWED_IPS (comma separated addresses or networks, matched
+# against the direct peer), and nobody when neither is set. Multiprocess mode is
+# switched on by the METRICS_MULTIPROC_DIR environment variable.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip.strip()]
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1.0))
+
+# Test runs keep the timing logger quiet unless TIMING_LOG_LEVEL asks otherwise,
+# every test client request would print a line
+TESTING = sys.argv[1:2] == ['test']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # One JSON line per sampled request or document job
+        'backend.timing': {
+            'handlers': ['console'],
+            'level': os.environ.get('TIMING_LOG_LEVEL', 'WARNING' if TESTING else 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # JWT Settings
 from datetime import timedelta
 
+# How long a process trusts a user's cached auth_version before checking it again
+JWT_USER_CACHE_TTL = int(os.environ.get('JWT_USER_CACHE_TTL', 30))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -198,5 +292,12 @@ CORS_ALLOWED_ORIGINS = [
 CORS_ALLOW_CREDENTIALS = True
 
 # File Upload Settings
-FILE_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
-DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
\ No newline at end of file
+# Multipart uploads above this size are spooled to a temp file instead of RAM;
+# large documents should use the chunked upload endpoints
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.environ.get('FILE_UPLOAD_MAX_MEMORY_SIZE', 2621440))  # 2.5MB
+DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
+# Same as Django's defaults, but the SHA-256 is computed as the upload is read
+FILE_UPLOAD_HANDLERS = [
+    'documents.uploads.HashingMemoryFileUploadHandler',
+    'documents.uploads.HashingTemporaryFileUploadHandler',
+]
@@ -0,0 +1,24 @@
+from django.test import TestCase, override_settings
+
+
+class MetricsAccessTests(TestCase):
+    def scrape(self, **extra):
+        return self.client.get('/metrics', **extra)
+
+    @override_settings(METRICS_TOKEN='', METRICS_ALLOWED_IPS=[])
+    def test_closed_by_default(self):
+        self.assertEqual(self.scrape().status_code, 403)
+
+    @override_settings(METRICS_TOKEN='s3cret', METRICS_ALLOWED_IPS=[])
+    def test_token(self):
+        self.assertEqual(self.scrape().status_code, 401)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        response = self.scrape(HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'http_requests_total', response.content)
+
+    @override_settings(METRICS_TOKEN='', METRICS_ALLOWED_IPS=['10.0.0.0/8', '::1'])
+    def test_allowed_ips(self):
+        self.assertEqual(self.scrape(REMOTE_ADDR='10.1.2.3').status_code, 200)
+        self.assertEqual(self.scrape(REMOTE_ADDR='::1').status_code, 200)
+        self.assertEqual(self.scrape(REMOTE_ADDR='192.168.1.5').status_code, 403)
@@ -0,0 +1,141 @@
+"""Per-request timing spans, reported as Server-Timing headers and log lines.
+
+ServerTimingMiddleware times every SQL query through an execute_wrapper and
+collects the spans opened with ``span()`` while the request runs (PDF open,
+text extraction, OCR, parsing, PO rendering, DRF rendering). Spans record self
+time: a query or a page extraction running inside a ``parse`` span is counted
+under its own name only, so the numbers add up to the total.
+
+Only a SERVER_TIMING_SAMPLE_RATE fraction of requests is instrumented. For the
+rest ``span()`` is a context variable lookup and the middleware adds nothing.
+"""
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('timings', default=None)
+
+
+class Timings:
+    """Self time and call count per span name"""
+
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+        # Time spent in child spans of each open span
+        self._children = []
+
+    def start(self):
+        self._children.append(0.0)
+        return time.perf_counter()
+
+    def stop(self, name, started):
+        elapsed = time.perf_counter() - started
+        children = self._children.pop()
+        if self._children:
+            self._children[-1] += elapsed
+        self.totals[name] = self.totals.get(name, 0.0) + elapsed - children
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def as_dict(self, total):
+        spans = {
+            name: {'ms': round(seconds * 1000, 2), 'count': self.counts[name]}
+            for name, seconds in self.totals.items()
+        }
+        spans['app'] = {'ms': round((total - sum(self.totals.values())) * 1000, 2), 'count': 1}
+        return spans
+
+    def header(self, total):
+        parts = [
+            f'{name};dur={span["ms"]};desc="{span["count"]}x"' if span['count'] > 1 else f'{name};dur={span["ms"]}'
+            for name, span in self.as_dict(total).items()
+        ]
+        parts.append(f'total;dur={round(total * 1000, 2)}')
+        return ', '.join(parts)
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block under ``name`` if the current request is sampled"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = timings.start()
+    try:
+        yield
+    finally:
+        timings.stop(name, started)
+
+
+@contextmanager
+def collect(label, **fields):
+    """Instrument work outside a request (document jobs) and log it like a request"""
+    timings = Timings()
+    token = _current.set(timings)
+    started = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+        total = time.perf_counter() - started
+        log(label, total, timings, **fields)
+
+
+def log(label, total, timings, **fields):
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    logger.info(json.dumps({
+        'event': label,
+        **fields,
+        'total_ms': round(total * 1000, 2),
+        'spans': timings.as_dict(total),
+    }))
+
+
+def _time_query(execute, sql, params, many, context):
+    with span('db'):
+        return execute(sql, params, many, context)
+
+
+class ServerTimingMiddleware:
+    """Add a Server-Timing header and a structured log line to sampled requests"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'SERVER_TIMING_SAMPLE_RATE', 1.0)
+
+    def __call__(self, request):
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return self.get_response(request)
+
+        timings = Timings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(_time_query):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+
+        # Streaming bodies are produced after this point and are not included
+        response['Server-Timing'] = timings.header(total)
+        log('request', total, timings, method=request.method, path=request.path, status=response.status_code)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns, time that separately
+        timings = _current.get()
+        if timings is not None:
+            started = timings.start()
+            response.add_post_render_callback(lambda rendered: timings.stop('render', started))
+        return response
@@ -0,0 +1,18 @@
+from django.contrib import admin
+from .models import Blob, DocumentJob
+
+
+@admin.register(DocumentJob)
+class DocumentJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'purchase_request', 'status', 'attempts', 'available_at', 'updated_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('purchase_request__title',)
+    readonly_fields = ('created_at', 'updated_at', 'locked_at')
+
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ('key', 'size', 'refcount', 'updated_at')
+    list_filter = ('refcount',)
+    search_fields = ('key',)
+    readonly_fields = ('key', 'size', 'refcount', 'updated_at')
@@ -0,0 +1,202 @@
+"""Chunked, resumable uploads assembled on disk.
+
+A client opens a session with the file name and total size, PUTs the bytes
+in chunks at explicit offsets and then finalizes. Each chunk is copied from
+the request stream to the session's temp file in small pieces, so a worker's
+memory stays flat whatever the file size. Bytes that reached the disk count
+even when the connection drops mid-chunk: the temp file's size is the offset
+to resume from.
+
+The SHA-256 is updated as chunks arrive, in the process receiving them. When
+the next chunk lands in another worker the running hash cannot follow it
+(hashlib state does not leave the process) and finalizing hashes the file
+once instead. The finished file is handed to the storage with its hash, so
+with ContentAddressedStorage attaching it is a rename.
+"""
+import fcntl
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+from .models import UploadSession
+from .services.cache import file_sha256
+from .storage import ContentAddressedStorage
+
+# Read from the request stream this much at a time
+PIECE_SIZE = 64 * 1024
+# Leading bytes of the accepted types, checked against the declared extension
+SIGNATURES = {
+    '.pdf': [b'%PDF-'],
+    '.png': [b'\x89PNG\r\n\x1a\n'],
+    '.jpg': [b'\xff\xd8\xff'],
+    '.jpeg': [b'\xff\xd8\xff'],
+}
+HEAD_SIZE = max(len(signature) for signatures in SIGNATURES.values() for signature in signatures)
+
+# session id -> (offset, running sha256) for uploads whose chunks reached this process
+_digests = {}
+MAX_DIGESTS = 1000
+
+
+class UploadError(Exception):
+    """A chunk or finalize call that can't be applied; offset is where the client should resume"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class AssembledUpload(File):
+    """A finished temp file, shaped like a TemporaryUploadedFile for Storage.save"""
+
+    def __init__(self, path, name, sha256):
+        super().__init__(open(path, 'rb'), name)
+        self.path = path
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def upload_dir():
+    # Next to the blobs, so attaching the finished file is a rename
+    if isinstance(default_storage, ContentAddressedStorage):
+        return default_storage.tmp_dir()
+    return settings.FILE_UPLOAD_TEMP_DIR or tempfile.gettempdir()
+
+
+def temp_path(session):
+    return os.path.join(upload_dir(), f'upload-{session.id}')
+
+
+def _matches(ext, head, complete=False, offset=0):
+    """Whether head is (complete) or, as the bytes at offset, could still become (not complete) one of the type's signatures"""
+    for signature in SIGNATURES[ext]:
+        if complete and head.startswith(signature):
+            return True
+        rest = signature[offset:]
+        if not complete and head[:len(rest)] == rest[:len(head)]:
+            return True
+    return False
+
+
+def start(purchase_request, user, document, filename, size):
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in SIGNATURES:
+        raise UploadError(f"Unsupported file type, expected one of {', '.join(SIGNATURES)}", status=415)
+    if size > settings.DOCUMENT_UPLOAD_MAX_SIZE:
+        raise UploadError(f'File is larger than {settings.DOCUMENT_UPLOAD_MAX_SIZE} bytes', status=413)
+
+    session = UploadSession.objects.create(
+        purchase_request=purchase_request,
+        created_by=user,
+        document=document,
+        filename=filename,
+        size=size
+    )
+    os.makedirs(upload_dir(), exist_ok=True)
+    open(temp_path(session), 'xb').close()
+    return session
+
+
+def received(session):
+    """Bytes of the upload on disk so far"""
+    try:
+        return os.path.getsize(temp_path(session))
+    except FileNotFoundError:
+        raise UploadError('Upload expired, start a new one', status=410)
+
+
+def write_chunk(session, offset, stream, length):
+    """Append length bytes read from stream at offset, return the new offset"""
+    if length > settings.DOCUMENT_UPLOAD_CHUNK_SIZE:
+        raise UploadError(f'Chunks are limited to {settings.DOCUMENT_UPLOAD_CHUNK_SIZE} bytes', status=413)
+    if offset + length > session.size:
+        raise UploadError(f'Chunk goes past the declared size of {session.size} bytes')
+
+    try:
+        f = open(temp_path(session), 'r+b')
+    except FileNotFoundError:
+        raise UploadError('Upload expired, start a new one', status=410)
+    with f:
+        try:
+            # Released when the file is closed, also if the worker dies
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError('Another chunk of this upload is being written', status=409)
+        current = os.fstat(f.fileno()).st_size
+        if offset != current:
+            raise UploadError(f'Expected a chunk at offset {current}', status=409, offset=current)
+
+        session_id = str(session.id)
+        entry = _digests.pop(session_id, None)
+        if offset == 0:
+            digest = hashlib.sha256()
+        else:
+            digest = entry[1] if entry is not None and entry[0] == offset else None
+
+        ext = os.path.splitext(session.filename)[1].lower()
+        f.seek(offset)
+        remaining = length
+        try:
+            while remaining:
+                piece = stream.read(min(PIECE_SIZE, remaining))
+                if not piece:
+                    break
+                # Reject the wrong kind of file before storing any of it
+                position = f.tell()
+                if position < HEAD_SIZE and not _matches(ext, piece[:HEAD_SIZE - position], offset=position):
+                    raise UploadError(f'File content does not look like {ext}', status=415, offset=position)
+                f.write(piece)
+                if digest is not None:
+                    digest.update(piece)
+                remaining -= len(piece)
+        except OSError:
+            # The client went away mid-chunk, keep what arrived
+            pass
+        f.flush()
+        offset = f.tell()
+
+    if digest is not None:
+        if len(_digests) >= MAX_DIGESTS:
+            _digests.clear()
+        _digests[session_id] = (offset, digest)
+    if remaining:
+        raise UploadError(f'Chunk ended after {length - remaining} of {length} bytes', offset=offset)
+    return offset
+
+
+def finish(session):
+    """The complete upload, ready to be assigned to a FileField"""
+    size = received(session)
+    if size != session.size:
+        raise UploadError(f'Received {size} of {session.size} bytes', status=409, offset=size)
+
+    path = temp_path(session)
+    ext = os.path.splitext(session.filename)[1].lower()
+    with open(path, 'rb') as f:
+        if not _matches(ext, f.read(HEAD_SIZE), complete=True):
+            raise UploadError(f'File content does not look like {ext}', status=415)
+
+    entry = _digests.pop(str(session.id), None)
+    if entry is not None and entry[0] == size:
+        sha256 = entry[1].hexdigest()
+    else:
+        # Chunks were spread over several processes
+        sha256 = file_sha256(path)
+    return AssembledUpload(path, session.filename, sha256)
+
+
+def discard(session):
+    """Drop the session and whatever of its file the storage did not take"""
+    _digests.pop(str(session.id), None)
+    try:
+        os.remove(temp_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
@@ -0,0 +1,138 @@
+"""Serving stored documents to authenticated users.
+
+Callers check access and hand over the FieldFile. The response carries a
+strong ETag taken from the content address (files stored under older names
+get a weak one from mtime and size), so a client that already has the file
+gets a 304 without a byte of the body. What leaves the app depends on
+DOCUMENT_DOWNLOAD_OFFLOAD:
+
+- '' streams the file from the worker, with single-range ``Range`` support
+  so PDF viewers can fetch pages on demand
+- 'x-accel-redirect' hands the transfer to nginx through an internal
+  location aliased to MEDIA_ROOT (DOCUMENT_DOWNLOAD_ACCEL_PREFIX)
+- 'x-sendfile' hands it to Apache mod_xsendfile or lighttpd
+
+The front server handles ranges itself in the last two modes.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header
+from rest_framework.renderers import JSONRenderer
+
+from .storage import KEY_RE, blob_key
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CACHE_CONTROL = 'private, no-cache'
+
+
+class AnyMediaJSONRenderer(JSONRenderer):
+    """Fallback so download views accept any Accept header, listed after JSONRenderer"""
+    media_type = '*/*'
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def etag_for(name, path):
+    key = blob_key(name)
+    if key is not None:
+        return f'"{KEY_RE.match(key)["sha256"]}"'
+    stat = os.stat(path)
+    return f'W/"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single byte range, None to send the whole file"""
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        # Multiple ranges or other units: answering with the full body is allowed
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range, the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def _read_range(path, start, length, block_size=FileResponse.block_size):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(block_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve(request, field_file, filename, as_attachment=False):
+    """Response for the file behind field_file, offered to the client as filename"""
+    path = field_file.path
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        raise Http404('File not found')
+    etag = etag_for(field_file.name, path)
+
+    # 304 on a matching If-None-Match (412 on a failed If-Match)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response['Cache-Control'] = CACHE_CONTROL
+        return response
+
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    offload = settings.DOCUMENT_DOWNLOAD_OFFLOAD
+    if offload == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        relative = os.path.relpath(path, field_file.storage.location).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = settings.DOCUMENT_DOWNLOAD_ACCEL_PREFIX + quote(relative)
+    elif offload == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    elif offload:
+        raise ImproperlyConfigured(f'Unknown DOCUMENT_DOWNLOAD_OFFLOAD {offload!r}')
+    else:
+        byte_range = None
+        range_header = request.META.get('HTTP_RANGE')
+        if_range = request.META.get('HTTP_IF_RANGE')
+        # If-Range asks for the range only if the file is still the one it has,
+        # which a weak ETag can't vouch for
+        if range_header and (if_range is None or (if_range == etag and not etag.startswith('W/'))):
+            try:
+                byte_range = parse_range(range_header, size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                response['ETag'] = etag
+                return response
+
+        if byte_range is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(_read_range(path, start, end - start + 1), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    response['ETag'] = etag
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
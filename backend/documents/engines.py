@@ -0,0 +1,50 @@
+"""Registry of the heavy document engines, imported on first use.
+
+pdfplumber/pdfminer, Pillow, pytesseract and reportlab add tens of MB and
+tens of ms to every process that imports them. The services only reach them
+through ``get()``, so a web worker that never extracts or renders a document
+never loads them. Entries are dotted paths and DOCUMENT_ENGINES in settings
+can point a name at another implementation.
+
+Processes that will need the engines anyway (document job pools, dedicated
+extraction workers) can load them up front with ``warm_up()``, or by setting
+DOCUMENT_ENGINES_WARM_UP for the gunicorn and pool hooks that call
+``warm_up_if_configured()``.
+"""
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+ENGINES = {
+    # file path -> iterator of text lines
+    'pdf_text': 'documents.services.pdf_text.iter_pdf_lines',
+    # image file path -> text
+    'ocr': 'documents.services.ocr.image_to_text',
+    # po_context() dict -> PDF bytes
+    'po_renderer': 'documents.services.po_generator.render_po',
+}
+
+_resolved = {}
+
+
+def _paths():
+    return {**ENGINES, **getattr(settings, 'DOCUMENT_ENGINES', {})}
+
+
+def get(name):
+    try:
+        return _resolved[name]
+    except KeyError:
+        pass
+    engine = _resolved[name] = import_string(_paths()[name])
+    return engine
+
+
+def warm_up(names=None):
+    """Import the given engines (all by default) now instead of on first use"""
+    for name in names or _paths():
+        get(name)
+
+
+def warm_up_if_configured():
+    if getattr(settings, 'DOCUMENT_ENGINES_WARM_UP', False):
+        warm_up()
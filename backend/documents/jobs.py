@@ -0,0 +1,172 @@
+"""DB-backed queue for slow document work (extraction, OCR).
+
+Jobs are claimed with a guarded UPDATE so several workers can poll the same
+table. Handlers are split in three: ``prepare`` loads what the job needs
+from the database, ``run`` does the heavy lifting in a pool process and must
+not touch the database, ``apply`` persists the result. ``prepare`` and
+``apply`` run in the worker's main process.
+"""
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F, Q
+from django.utils import timezone
+
+from backend import timing
+
+from requests.models import PurchaseRequest
+from . import engines
+from .models import DocumentJob
+
+# A running job whose worker has not reported back after this long is retried
+LOCK_TIMEOUT = timedelta(minutes=10)
+RETRY_DELAY = timedelta(seconds=10)
+
+
+def prepare_payload(job):
+    return job.payload
+
+
+def run_extract_proforma(payload):
+    from .services import extract
+    return extract.extract_proforma_data(payload['path'])
+
+
+def apply_extract_proforma(job, result):
+    # Guarded UPDATE: a proforma replaced while this job was queued or running
+    # no longer matches, and the stale result is dropped
+    PurchaseRequest.objects.filter(
+        id=job.purchase_request_id,
+        proforma_file=job.payload['file']
+    ).update(proforma_data=result, updated_at=timezone.now())
+
+
+def prepare_render_po(job):
+    from .services import po_generator
+    return po_generator.po_context(job.purchase_request)
+
+
+def run_render_po(context):
+    return engines.get('po_renderer')(context)
+
+
+def apply_render_po(job, pdf):
+    purchase_request = job.purchase_request
+    # Rendering is idempotent: a PO that is already attached is never replaced
+    if purchase_request.purchase_order_file:
+        return
+    saved_path = default_storage.save(f'purchase_orders/po_{purchase_request.id}.pdf', ContentFile(pdf))
+    # Plain UPDATE so saving the file does not fire post_save again
+    attached = PurchaseRequest.objects.filter(
+        Q(purchase_order_file='') | Q(purchase_order_file__isnull=True),
+        id=purchase_request.id
+    ).update(purchase_order_file=saved_path, updated_at=timezone.now())
+    if not attached:
+        # Another attempt attached its PO first, drop this file's reference
+        default_storage.delete(saved_path)
+
+
+HANDLERS = {
+    'extract_proforma': (prepare_payload, run_extract_proforma, apply_extract_proforma),
+    'render_po': (prepare_render_po, run_render_po, apply_render_po),
+}
+
+
+def enqueue(kind, purchase_request, payload):
+    return DocumentJob.objects.create(
+        kind=kind,
+        purchase_request=purchase_request,
+        payload=payload
+    )
+
+
+def enqueue_proforma_extraction(purchase_request):
+    return enqueue('extract_proforma', purchase_request, {
+        'file': purchase_request.proforma_file.name,
+        'path': purchase_request.proforma_file.path,
+    })
+
+
+def enqueue_purchase_order(purchase_request_id):
+    """Queue PO rendering unless one is already waiting for this request"""
+    pending = DocumentJob.objects.filter(
+        kind='render_po',
+        purchase_request_id=purchase_request_id,
+        status__in=['queued', 'running']
+    )
+    if pending.exists():
+        return None
+    return DocumentJob.objects.create(kind='render_po', purchase_request_id=purchase_request_id)
+
+
+def enqueue_purchase_orders(purchase_request_ids):
+    """Batched enqueue_purchase_order: one lookup and one insert for the whole set"""
+    waiting = set(DocumentJob.objects.filter(
+        kind='render_po',
+        purchase_request_id__in=purchase_request_ids,
+        status__in=['queued', 'running']
+    ).values_list('purchase_request_id', flat=True))
+    return DocumentJob.objects.bulk_create([
+        DocumentJob(kind='render_po', purchase_request_id=request_id)
+        for request_id in purchase_request_ids
+        if request_id not in waiting
+    ])
+
+
+def _claimable(now):
+    return (
+        Q(status='queued', available_at__lte=now) |
+        Q(status='running', locked_at__lt=now - LOCK_TIMEOUT)
+    )
+
+
+def claim(limit):
+    """Atomically mark up to ``limit`` due jobs as running and return them"""
+    now = timezone.now()
+    candidates = list(
+        DocumentJob.objects.filter(_claimable(now)).values_list('id', flat=True)[:limit]
+    )
+    claimed = [
+        job_id for job_id in candidates
+        if DocumentJob.objects.filter(_claimable(now), id=job_id).update(
+            status='running',
+            locked_at=now,
+            attempts=F('attempts') + 1,
+            updated_at=now
+        )
+    ]
+    return list(DocumentJob.objects.filter(id__in=claimed).select_related('purchase_request'))
+
+
+def prepare(job):
+    """Arguments for execute(), resolved in the worker's main process"""
+    prepare, _, _ = HANDLERS[job.kind]
+    return prepare(job)
+
+
+def execute(kind, args):
+    """Entry point for pool processes"""
+    _, run, _ = HANDLERS[kind]
+    with timing.collect('document_job', kind=kind):
+        return run(args)
+
+
+def complete(job, result):
+    _, _, apply = HANDLERS[job.kind]
+    apply(job, result)
+    job.status = 'done'
+    job.error = ''
+    job.locked_at = None
+    job.save(update_fields=['status', 'error', 'locked_at', 'updated_at'])
+
+
+def fail(job, error):
+    job.error = str(error)
+    job.locked_at = None
+    if job.attempts < job.max_attempts:
+        job.status = 'queued'
+        job.available_at = timezone.now() + RETRY_DELAY * (2 ** (job.attempts - 1))
+    else:
+        job.status = 'failed'
+    job.save(update_fields=['status', 'error', 'locked_at', 'available_at', 'updated_at'])
@@ -0,0 +1,90 @@
+from multiprocessing import get_context
+import os
+import resource
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+
+def build_pdf(path, pages, lines_per_page):
+    """Synthetic supplier catalog: vendor header, priced lines, grand total on the last page"""
+    pdf = canvas.Canvas(path, pagesize=letter)
+    line_number = 0
+    for page in range(pages):
+        y = 750
+        if page == 0:
+            pdf.drawString(50, y, 'Acme Industrial Supplies')
+            y -= 20
+        for _ in range(lines_per_page):
+            pdf.drawString(50, y, f'Catalog item {line_number} part A-{line_number % 97} {10 + line_number % 90}.99')
+            line_number += 1
+            y -= 15
+        if page == pages - 1:
+            pdf.drawString(50, y, f'Grand Total {line_number * 55}.00')
+        pdf.showPage()
+    pdf.save()
+
+
+def legacy_lines(path):
+    """The pre-streaming read: every page's text concatenated before parsing"""
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        text = ''
+        for page in pdf.pages:
+            text += (page.extract_text() or '') + '\n'
+    return [line.strip() for line in text.split('\n') if line.strip()]
+
+
+def measure(kind, path, queue):
+    from documents import engines
+    from documents.services import extract, receipt_validation
+    from documents.services.pdf_text import iter_pdf_lines
+    # Measure extraction, not the first-use import of pdfplumber
+    engines.warm_up(['pdf_text'])
+    run = {
+        'proforma': extract.extract_from_pdf,
+        'receipt': receipt_validation.extract_receipt_from_pdf,
+        'streamed': lambda path: {'items': list(iter_pdf_lines(path))},
+        'legacy': lambda path: {'items': legacy_lines(path)},
+    }[kind]
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    data = run(path)
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, before, after, len(data.get('items', []))))
+
+
+class Command(BaseCommand):
+    help = 'Measure time and peak RSS of PDF extraction on a large synthetic PDF'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=200)
+        parser.add_argument('--lines-per-page', type=int, default=45)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'catalog.pdf')
+            build_pdf(path, options['pages'], options['lines_per_page'])
+            size_mb = os.path.getsize(path) / 1024 / 1024
+            self.stdout.write(f"{options['pages']} pages, {size_mb:.1f} MB")
+
+            # A fresh process per run so ru_maxrss is not polluted by earlier
+            # runs. 'streamed' and 'legacy' read every page's text without
+            # stopping at the grand total: the page-by-page reader the
+            # extractors use against the old whole-document concatenation
+            context = get_context('spawn')
+            for kind in ['proforma', 'receipt', 'streamed', 'legacy']:
+                queue = context.Queue()
+                process = context.Process(target=measure, args=(kind, path, queue))
+                process.start()
+                elapsed, before, after, items = queue.get()
+                process.join()
+                self.stdout.write(
+                    f'{kind:>9}: {elapsed:6.2f}s  peak RSS {after / 1024:7.1f} MB '
+                    f'(+{(after - before) / 1024:.1f} MB during extraction), {items} items/lines'
+                )
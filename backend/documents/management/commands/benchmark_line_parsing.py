@@ -0,0 +1,62 @@
+import random
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from documents.services import extract, receipt_validation
+from documents.services.lines import LineItem
+
+
+def build_corpus(count, seed):
+    """Synthetic receipt text: vendor header, item lines with OCR-ish noise, totals"""
+    rng = random.Random(seed)
+    words = ['Laptop', 'Chair', 'Paper', 'Toner', 'Cable', 'Monitor', 'Desk', 'Lamp', 'Router', 'Licence']
+    lines = ['Acme Office Supplies', '12 Market Street', '']
+    for i in range(count):
+        name = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+        roll = rng.random()
+        if roll < 0.75:
+            lines.append(f'{name} x{rng.randint(1, 9)} {rng.randint(1, 2000)}.{rng.randint(0, 99):02d}')
+        elif roll < 0.85:
+            lines.append(f'  {name} ref {rng.randint(1000, 99999)}  ')
+        elif roll < 0.9:
+            lines.append('')
+        else:
+            lines.append(f'Subtotal {rng.randint(1, 9999)}.00')
+    lines.append('Total 123456.78')
+    return lines
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark the shared line classifier on a large synthetic receipt corpus'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=200000)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        corpus = build_corpus(options['lines'], options['seed'])
+        self.stdout.write(f'{len(corpus)} lines')
+
+        parsers = [
+            ('receipt', receipt_validation.parse_receipt_lines),
+            ('proforma', extract.parse_proforma_lines),
+        ]
+        for name, parse in parsers:
+            best = None
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                data = parse(corpus)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            self.stdout.write(
+                f'{name:>9}: {best * 1000:8.1f} ms best of {options["repeat"]}, '
+                f'{len(corpus) / best:,.0f} lines/s, {len(data["items"])} items'
+            )
+
+        record = LineItem('Laptop', 1)
+        as_dict = {'name': 'Laptop', 'price': 1, 'quantity': 1}
+        self.stdout.write(
+            f'item record: {sys.getsizeof(record)} bytes slotted vs {sys.getsizeof(as_dict)} bytes as dict'
+        )
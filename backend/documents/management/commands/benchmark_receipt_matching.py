@@ -0,0 +1,85 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from documents.services.matching import match_items, trigrams
+
+
+def brute_force(po_names, receipt_names, threshold):
+    """Reference O(n*m) matcher with the same similarity and tie-breaking"""
+    receipt_grams = [trigrams(name) for name in receipt_names]
+    used = set()
+    matches = []
+    for name in po_names:
+        query = trigrams(name)
+        scored = []
+        for position, grams in enumerate(receipt_grams):
+            overlap = len(query & grams)
+            if not overlap:
+                continue
+            similarity = overlap / (len(query) + len(grams) - overlap)
+            if similarity >= threshold:
+                scored.append((-similarity, position))
+        scored.sort()
+        match = next((position for _, position in scored if position not in used), None)
+        if match is not None:
+            used.add(match)
+        matches.append(match)
+    return matches
+
+
+def noisy(name, rng):
+    """Simulate OCR noise: swapped, dropped or substituted characters"""
+    chars = list(name)
+    for _ in range(rng.randint(0, 2)):
+        position = rng.randrange(len(chars))
+        roll = rng.random()
+        if roll < 0.4:
+            chars[position] = rng.choice('0O1lI5S8B')
+        elif roll < 0.7 and len(chars) > 4:
+            del chars[position]
+        else:
+            chars.insert(position, rng.choice('abcdefghijklmnopqrstuvwxyz'))
+    return ''.join(chars)
+
+
+class Command(BaseCommand):
+    help = 'Compare indexed fuzzy receipt matching against the O(n*m) scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='50,200,500,1000', help='Comma separated receipt sizes')
+        parser.add_argument('--threshold', type=float, default=0.5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        threshold = options['threshold']
+        words = [
+            'laptop', 'chair', 'printer', 'paper', 'toner', 'cable', 'monitor', 'desk', 'lamp',
+            'router', 'licence', 'keyboard', 'mouse', 'headset', 'webcam', 'dock', 'adapter', 'ssd'
+        ]
+        # Catalog-like names: product words, a brand and a model number
+        letters = 'abcdefghijklmnopqrstuvwxyz'
+        brands = [''.join(rng.choice(letters) for _ in range(rng.randint(4, 7))) for _ in range(200)]
+
+        self.stdout.write(f"{'lines':>6} {'indexed ms':>11} {'scan ms':>9} {'matched':>8} {'agree':>6}")
+        for size in [int(size) for size in options['sizes'].split(',')]:
+            po_names = [
+                f"{rng.choice(brands)} {' '.join(rng.sample(words, 2))} "
+                f"{rng.choice(letters).upper()}{rng.randint(100, 9999)}"
+                for _ in range(size)
+            ]
+            receipt_names = [noisy(name, rng) for name in po_names]
+            rng.shuffle(receipt_names)
+
+            start = time.perf_counter()
+            indexed = match_items(po_names, receipt_names, threshold)
+            indexed_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            scanned = brute_force(po_names, receipt_names, threshold)
+            scan_ms = (time.perf_counter() - start) * 1000
+
+            matched = sum(match is not None for match in indexed)
+            agree = sum(a == b for a, b in zip(indexed, scanned)) / size
+            self.stdout.write(f'{size:>6} {indexed_ms:>11.1f} {scan_ms:>9.1f} {matched:>8} {agree:>6.0%}')
@@ -0,0 +1,90 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# What a gunicorn worker does before serving its first request, optionally
+# followed by the warm-up hook. Reports RSS from /proc when available.
+BOOT = '''
+import json, resource, sys, time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+if sys.argv[1] == 'warm':
+    from documents import engines
+    engines.warm_up()
+elapsed = time.perf_counter() - started
+rss = None
+try:
+    with open('/proc/self/status') as f:
+        rss = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+except OSError:
+    pass
+print(json.dumps({
+    'ms': elapsed * 1000,
+    'rss_kb': rss or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(sys.modules),
+}))
+'''
+
+
+def importtime_by_package(stderr):
+    """Self time of every imported module from -X importtime, summed per top-level package"""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+    return packages
+
+
+class Command(BaseCommand):
+    help = 'Compare worker boot time, RSS and imports with lazy document engines and with warm-up'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh processes per mode')
+        parser.add_argument('--top', type=int, default=8, help='Packages to list that only warm-up imports')
+
+    def handle(self, *args, **options):
+        results = {}
+        for mode in ['lazy', 'warm']:
+            runs, packages = [], {}
+            for _ in range(options['runs']):
+                completed = subprocess.run(
+                    [sys.executable, '-X', 'importtime', '-c', BOOT, mode],
+                    cwd=settings.BASE_DIR,
+                    env=os.environ.copy(),
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                )
+                runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+                packages = importtime_by_package(completed.stderr)
+            results[mode] = runs, packages
+
+        self.stdout.write(f"{'mode':<6} {'boot ms':>9} {'RSS MB':>8} {'modules':>8} {'import ms':>10}")
+        for mode, (runs, packages) in results.items():
+            self.stdout.write(
+                f"{mode:<6} {statistics.median(run['ms'] for run in runs):>9.1f} "
+                f"{statistics.median(run['rss_kb'] for run in runs) / 1024:>8.1f} "
+                f"{runs[0]['modules']:>8} {sum(packages.values()) / 1000:>10.1f}"
+            )
+
+        lazy, warm = results['lazy'][1], results['warm'][1]
+        deferred = sorted(
+            ((us - lazy.get(package, 0), package) for package, us in warm.items()),
+            reverse=True
+        )[:options['top']]
+        self.stdout.write('')
+        self.stdout.write('Import time deferred to first use, by package (last run):')
+        for us, package in deferred:
+            if us > 0:
+                self.stdout.write(f'  {package:<24} {us / 1000:>8.1f} ms')
@@ -0,0 +1,119 @@
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from documents import chunked
+from documents.models import Blob, UploadSession
+from documents.storage import ContentAddressedStorage, referenced_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed blobs no file field refers to, correct drifted reference counts and drop abandoned uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24,
+            help='Leave blobs and temp files touched more recently than this alone (uploads in flight)'
+        )
+        parser.add_argument('--storage', default='default', help='Alias in STORAGES to collect')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without changing it')
+
+    def handle(self, *args, **options):
+        storage = storages[options['storage']]
+        if not isinstance(storage, ContentAddressedStorage):
+            raise CommandError(f"Storage '{options['storage']}' is not a ContentAddressedStorage")
+        dry_run = options['dry_run']
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+
+        # Mark: what the database actually points at. Refcounts only pick the
+        # candidates, nothing that is still referenced is ever deleted.
+        referenced = referenced_keys()
+        on_disk = dict(storage.iter_blobs())
+        rows = {blob.key: blob for blob in Blob.objects.all()}
+
+        # Blobs written before their row (or by another tool) get one, so the
+        # lock below also covers them
+        missing = [
+            Blob(key=key, size=os.path.getsize(path), refcount=0, updated_at=self.mtime(path))
+            for key, path in on_disk.items() if key not in rows
+        ]
+        if missing and not dry_run:
+            Blob.objects.bulk_create(missing, ignore_conflicts=True)
+        rows.update((blob.key, blob) for blob in missing)
+
+        reconciled = 0
+        for key, blob in rows.items():
+            actual = referenced.get(key, 0)
+            # Recently touched rows may have saves in flight, leave them be
+            if blob.refcount == actual or blob.updated_at >= cutoff:
+                continue
+            reconciled += 1
+            if not dry_run:
+                Blob.objects.filter(key=key, refcount=blob.refcount, updated_at=blob.updated_at).update(refcount=actual)
+            blob.refcount = actual
+
+        deleted, freed = 0, 0
+        for key, blob in rows.items():
+            if blob.refcount or key in referenced or blob.updated_at >= cutoff:
+                continue
+            if dry_run:
+                deleted += 1
+                freed += blob.size
+                continue
+            # A concurrent save takes its reference on this row before it
+            # looks at the disk, so under the lock either it has already
+            # counted or it will find the file gone and write it again
+            with transaction.atomic():
+                locked = Blob.objects.select_for_update().filter(
+                    key=key, refcount=0, updated_at__lt=cutoff
+                ).first()
+                if locked is None:
+                    continue
+                try:
+                    os.remove(storage.blob_path(key))
+                    freed += locked.size
+                except FileNotFoundError:
+                    pass
+                locked.delete()
+            deleted += 1
+
+        # Chunked uploads nobody has written to within the grace period
+        abandoned = 0
+        for session in UploadSession.objects.filter(created_at__lt=cutoff):
+            path = chunked.temp_path(session)
+            if os.path.exists(path) and self.mtime(path) >= cutoff:
+                continue
+            abandoned += 1
+            if not dry_run:
+                chunked.discard(session)
+
+        stale_tmp = 0
+        tmp_dir = storage.tmp_dir()
+        if os.path.isdir(tmp_dir):
+            for entry in os.scandir(tmp_dir):
+                # Spools of saves that died half way
+                if entry.is_file() and self.mtime(entry.path) < cutoff:
+                    stale_tmp += 1
+                    if not dry_run:
+                        os.remove(entry.path)
+
+        self.stdout.write(f"{'blobs':<24} {len(rows):>10}")
+        self.stdout.write(f"{'referenced':<24} {len(referenced):>10}")
+        self.stdout.write(f"{'references':<24} {sum(referenced.values()):>10}")
+        self.stdout.write(f"{'refcounts corrected':<24} {reconciled:>10}")
+        self.stdout.write(f"{'blobs deleted':<24} {deleted:>10}")
+        self.stdout.write(f"{'MB freed':<24} {freed / 1024 / 1024:>10.1f}")
+        self.stdout.write(f"{'abandoned uploads':<24} {abandoned:>10}")
+        self.stdout.write(f"{'stale temp files':<24} {stale_tmp:>10}")
+        if dry_run:
+            self.stdout.write('Dry run, nothing was changed')
+
+    @staticmethod
+    def mtime(path):
+        return datetime.fromtimestamp(os.path.getmtime(path), tz=dt_timezone.utc)
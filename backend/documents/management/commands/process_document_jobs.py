@@ -0,0 +1,80 @@
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from documents import jobs, pool as document_pool
+
+
+class Command(BaseCommand):
+    help = 'Process queued document jobs (proforma extraction, PO rendering) in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Pool size')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between polls when idle')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is drained')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        poll_interval = options['poll_interval']
+
+        # Pool processes never touch the database, don't let them hold connections
+        connections.close_all()
+
+        self.stdout.write(f'Processing document jobs with {workers} worker(s)...')
+        in_flight = {}
+        pool = document_pool.new_pool(workers)
+        try:
+            while True:
+                broken = False
+                free = workers - len(in_flight)
+                if free:
+                    for job in jobs.claim(free):
+                        try:
+                            args = jobs.prepare(job)
+                            future = pool.submit(jobs.execute, job.kind, args)
+                        except Exception as e:
+                            self.fail(job, e)
+                            # The pool refuses new work once a worker has died
+                            broken = isinstance(e, BrokenProcessPool)
+                            if broken:
+                                break
+                            continue
+                        in_flight[future] = job
+
+                if not in_flight and not broken:
+                    if options['once']:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                done, _ = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = in_flight.pop(future)
+                    try:
+                        jobs.complete(job, future.result())
+                        self.stdout.write(self.style.SUCCESS(f'Completed {job}'))
+                    except Exception as e:
+                        self.fail(job, e)
+                        broken = broken or isinstance(e, BrokenProcessPool)
+
+                if broken:
+                    # A worker died (OOM killer, crash in a parser) and took
+                    # the pool with it: whatever was still pending is lost, so
+                    # put those jobs back in the queue and start a fresh pool
+                    for job in in_flight.values():
+                        self.fail(job, BrokenProcessPool('Worker pool broke while the job was pending'))
+                    in_flight.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    self.stdout.write(self.style.WARNING('Restarting the worker pool'))
+                    pool = document_pool.new_pool(workers)
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+        self.stdout.write('Queue drained.')
+
+    def fail(self, job, error):
+        jobs.fail(job, error)
+        self.stdout.write(self.style.ERROR(f'Failed {job}: {error}'))
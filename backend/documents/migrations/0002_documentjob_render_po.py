@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 02:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='documentjob',
+            name='kind',
+            field=models.CharField(choices=[('extract_proforma', 'Extract proforma'), ('render_po', 'Render purchase order')], max_length=50),
+        ),
+    ]
@@ -0,0 +1,79 @@
+import uuid
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+
+class DocumentJob(models.Model):
+    """A unit of document work processed outside the request cycle"""
+    KIND_CHOICES = [
+        ('extract_proforma', 'Extract proforma'),
+        ('render_po', 'Render purchase order'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    purchase_request = models.ForeignKey(
+        'requests.PurchaseRequest',
+        on_delete=models.CASCADE,
+        related_name='document_jobs'
+    )
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    error = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['available_at', 'id']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.id} - {self.status}"
+
+
+class Blob(models.Model):
+    """A file in ContentAddressedStorage and how many file fields refer to it"""
+    # '<sha256><ext>', also the blob's file name on disk
+    key = models.CharField(max_length=80, primary_key=True)
+    size = models.BigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    # Set on every reference change, gc_blobs leaves recently touched blobs alone
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.key} ({self.refcount} refs)"
+
+
+class UploadSession(models.Model):
+    """A chunked upload being assembled in a temp file, see documents.chunked"""
+    DOCUMENT_CHOICES = [
+        ('proforma', 'Proforma'),
+        ('receipt', 'Receipt'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    purchase_request = models.ForeignKey(
+        'requests.PurchaseRequest',
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    document = models.CharField(max_length=20, choices=DOCUMENT_CHOICES)
+    filename = models.CharField(max_length=255)
+    # Declared by the client up front; bytes received so far is the temp file's size
+    size = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_document_display()} upload {self.id} for request #{self.purchase_request_id}"
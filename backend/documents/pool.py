@@ -0,0 +1,47 @@
+"""Process pools for CPU-bound document work.
+
+``get_pool()`` is the pool for work started from web requests; it is created
+lazily on first use and reused for the life of the process.
+``new_pool()`` builds a pool for callers that manage its lifetime themselves
+(the document job worker). Both use the spawn start method so pool processes
+don't inherit the parent's database connections or threads; they only ever
+parse and render files.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import threading
+
+import django
+from django.conf import settings
+from . import engines
+
+_pool = None
+_lock = threading.Lock()
+
+
+def _usable(pool):
+    # A pool whose worker died is permanently broken, replace it
+    return pool is not None and not getattr(pool, '_broken', False)
+
+
+def _init_process():
+    # Spawned processes start from scratch; job handlers import models
+    django.setup()
+    engines.warm_up_if_configured()
+
+
+def new_pool(max_workers):
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=get_context('spawn'),
+        initializer=_init_process
+    )
+
+
+def get_pool():
+    global _pool
+    if not _usable(_pool):
+        with _lock:
+            if not _usable(_pool):
+                _pool = new_pool(getattr(settings, 'DOCUMENT_POOL_WORKERS', 2))
+    return _pool
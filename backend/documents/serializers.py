@@ -1,13 +1,13 @@
 from rest_framework import serializers
+from .models import DocumentJob
 
 
 class ProformaExtractionSerializer(serializers.Serializer):
     vendor_name = serializers.CharField(max_length=200)
     vendor_address = serializers.CharField(required=False, allow_blank=True)
+    # Items carry Decimal prices and int quantities next to the name
     items = serializers.ListField(
-        child=serializers.DictField(
-            child=serializers.CharField()
-        )
+        child=serializers.DictField()
     )
     total_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
 
@@ -15,7 +15,7 @@ class ProformaExtractionSerializer(serializers.Serializer):
 class ReceiptValidationResultSerializer(serializers.Serializer):
     is_valid = serializers.BooleanField()
     discrepancies = serializers.ListField(
-        child=serializers.DictField()
+        child=serializers.CharField()
     )
     extracted_data = serializers.DictField()
 
@@ -26,4 +26,14 @@ class PurchaseOrderDataSerializer(serializers.Serializer):
     items = serializers.ListField()
     total_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
     request_id = serializers.IntegerField()
-    created_by = serializers.CharField()
\ No newline at end of file
+    created_by = serializers.CharField()
+
+
+class DocumentJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DocumentJob
+        fields = [
+            'id', 'kind', 'status', 'purchase_request', 'attempts',
+            'max_attempts', 'error', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
@@ -0,0 +1,137 @@
+"""Content-addressed cache for extraction and OCR results.
+
+Entries live on disk under DOCUMENT_CACHE_DIR, keyed by the SHA-256 of the
+file bytes plus the extractor name and version, so the same file uploaded to
+different requests is only parsed once and bumping an extractor version
+invalidates its old results. Any process (web workers, document job pool)
+can read and write the cache. Every EVICT_EVERY writes a process drops the
+least recently used entries beyond DOCUMENT_CACHE_MAX_ENTRIES, so the cache
+can run over that limit by up to EVICT_EVERY entries per process.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from backend.metrics import EXTRACTION_CACHE
+from backend.timing import span
+from documents.storage import KEY_RE
+
+CHUNK_SIZE = 1024 * 1024
+# Monetary values are stored as strings and turned back into Decimal on read
+DECIMAL_KEYS = {'total_amount', 'price'}
+# Writes between two scans of the cache directory, per process
+EVICT_EVERY = 100
+
+_writes = 0
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_sha256(file_path):
+    """SHA-256 of the file, taken from the name of content-addressed blobs"""
+    match = KEY_RE.match(os.path.basename(file_path))
+    if match:
+        return match['sha256']
+    return file_sha256(file_path)
+
+
+def _cache_dir():
+    cache_dir = getattr(settings, 'DOCUMENT_CACHE_DIR', None)
+    return Path(cache_dir) if cache_dir else None
+
+
+def _entry_path(cache_dir, sha256, extractor, version):
+    # Fan out on the first two hex digits to keep directories small
+    return cache_dir / sha256[:2] / f'{sha256}-{extractor}-v{version}.json'
+
+
+def _restore_decimals(value):
+    if isinstance(value, dict):
+        return {
+            key: Decimal(item) if key in DECIMAL_KEYS and isinstance(item, str) else _restore_decimals(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_restore_decimals(item) for item in value]
+    return value
+
+
+def cached(extractor, version, file_path, compute):
+    """Return compute(file_path), reusing a previous result for identical bytes"""
+    cache_dir = _cache_dir()
+    if cache_dir is None:
+        return compute(file_path)
+
+    with span('doc-cache'):
+        path = _entry_path(cache_dir, content_sha256(file_path), extractor, version)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            # Bump the mtime, eviction uses it as the last-used time
+            os.utime(path)
+            EXTRACTION_CACHE.inc(extractor=extractor, result='hit')
+            return _restore_decimals(data)
+        except (FileNotFoundError, ValueError):
+            pass
+
+    EXTRACTION_CACHE.inc(extractor=extractor, result='miss')
+    data = compute(file_path)
+    # Nothing extracted (empty strings and lists, zero totals) usually means
+    # the extractor failed, don't pin it
+    if any(data.values()):
+        with span('doc-cache'):
+            _write(cache_dir, path, data)
+    return data
+
+
+def _write(cache_dir, path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename so concurrent readers never see a partial entry
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, cls=DjangoJSONEncoder)
+    os.replace(tmp_path, path)
+
+    global _writes
+    _writes += 1
+    if _writes % EVICT_EVERY == 0:
+        evict(cache_dir)
+
+
+def evict(cache_dir, max_entries=None):
+    """Drop the least recently used entries beyond max_entries"""
+    if max_entries is None:
+        max_entries = getattr(settings, 'DOCUMENT_CACHE_MAX_ENTRIES', 10000)
+
+    entries = []
+    for bucket in os.scandir(cache_dir):
+        if not bucket.is_dir():
+            continue
+        for entry in os.scandir(bucket.path):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                # Evicted by another process since the directory was listed
+                continue
+
+    if len(entries) <= max_entries:
+        return
+    entries.sort()
+    for _, entry_path in entries[:len(entries) - max_entries]:
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
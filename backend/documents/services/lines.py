@@ -0,0 +1,75 @@
+"""Line tokenizer/classifier shared by the proforma and receipt parsers.
+
+Every text line, whether it comes from pdfplumber or Tesseract, goes
+through classify() exactly once. It strips the line, runs the precompiled
+patterns a single time and returns a compact ParsedLine record that the
+parsers dispatch on.
+"""
+import re
+from decimal import Decimal
+
+AMOUNT = re.compile(r'\d+\.\d{2}')
+DIGIT = re.compile(r'\d')
+SUBTOTAL = re.compile(r'sub\s?total')
+
+# Line kinds
+HEADING = 'heading'      # short line without digits, e.g. a vendor name
+ITEM = 'item'            # text followed by an amount
+SUBTOTAL_LINE = 'subtotal'
+TOTAL_LINE = 'total'     # grand total, nothing after it is a line item
+TEXT = 'text'            # anything else
+
+# Headings are at most this many words
+MAX_HEADING_WORDS = 5
+
+
+class ParsedLine:
+    __slots__ = ('kind', 'text', 'label', 'amount', 'words')
+
+    def __init__(self, kind, text, label='', amount=None, words=0):
+        self.kind = kind
+        self.text = text
+        self.label = label
+        self.amount = amount
+        self.words = words
+
+    def __repr__(self):
+        return f'ParsedLine({self.kind!r}, {self.text!r})'
+
+
+class LineItem:
+    __slots__ = ('name', 'price', 'quantity')
+
+    def __init__(self, name, price, quantity=1):
+        self.name = name
+        self.price = price
+        self.quantity = quantity
+
+    def __repr__(self):
+        return f'LineItem({self.name!r}, {self.price!r}, {self.quantity!r})'
+
+
+def classify(raw):
+    """Classify one line of text, or return None for blank lines"""
+    text = raw.strip()
+    if not text:
+        return None
+
+    words = len(text.split())
+    amount = AMOUNT.search(text)
+
+    if amount is None:
+        if words <= MAX_HEADING_WORDS and DIGIT.search(text) is None:
+            return ParsedLine(HEADING, text, '', None, words)
+        return ParsedLine(TEXT, text, '', None, words)
+
+    # Everything before the first amount is the label
+    label = text[:amount.start()].strip()
+    value = Decimal(amount.group())
+
+    lowered = text.lower()
+    if 'total' in lowered:
+        kind = SUBTOTAL_LINE if SUBTOTAL.search(lowered) else TOTAL_LINE
+        return ParsedLine(kind, text, label, value, words)
+    return ParsedLine(ITEM, text, label, value, words)
+
@@ -0,0 +1,93 @@
+"""Fuzzy matching of PO items against receipt lines.
+
+Receipt lines are indexed by character trigram once. Similarity is the
+Jaccard index of two trigram sets. A line can only reach the threshold if it
+contains one of the query's rarest trigrams (prefix filtering), so each PO
+item only probes a few short posting lists and scores a handful of
+candidates instead of comparing every item with every line.
+"""
+import math
+import re
+from collections import defaultdict
+
+NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(name):
+    return NON_ALNUM.sub(' ', name.lower()).strip()
+
+
+def trigrams(name):
+    padded = f'  {normalize(name)} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Inverted index from trigram to the receipt lines containing it"""
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.grams = [trigrams(name) for name in self.names]
+        self.postings = defaultdict(list)
+        for position, grams in enumerate(self.grams):
+            for gram in grams:
+                self.postings[gram].append(position)
+
+    def candidates(self, name, threshold):
+        """(similarity, position) of lines at least threshold similar, best first"""
+        query = trigrams(name)
+        if not query:
+            return []
+
+        # Jaccard >= threshold needs an overlap of at least threshold * |query|,
+        # so a match must contain one of the first `prefix` rarest query grams
+        rarest = sorted(query, key=lambda gram: len(self.postings.get(gram, ())))
+        prefix = len(query) - math.ceil(threshold * len(query)) + 1
+        probed = set()
+        for gram in rarest[:prefix]:
+            probed.update(self.postings.get(gram, ()))
+
+        # Sets of very different sizes can't reach the threshold either
+        shortest = threshold * len(query)
+        longest = len(query) / threshold if threshold else math.inf
+
+        scored = []
+        for position in probed:
+            grams = self.grams[position]
+            if not shortest <= len(grams) <= longest:
+                continue
+            overlap = len(query & grams)
+            similarity = overlap / (len(query) + len(grams) - overlap)
+            if similarity >= threshold:
+                scored.append((similarity, position))
+        scored.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+        return scored
+
+
+def match_items(po_names, receipt_names, threshold):
+    """Pair each PO name with its most similar unused receipt line
+
+    Returns a list aligned with po_names holding a receipt position or None.
+    """
+    index = TrigramIndex(receipt_names)
+    exact = {}
+    for position, name in enumerate(index.names):
+        exact.setdefault(normalize(name), []).append(position)
+
+    used = set()
+    matches = []
+    for name in po_names:
+        match = None
+        for position in exact.get(normalize(name), ()):
+            if position not in used:
+                match = position
+                break
+        if match is None:
+            for _, position in index.candidates(name, threshold):
+                if position not in used:
+                    match = position
+                    break
+        if match is not None:
+            used.add(match)
+        matches.append(match)
+    return matches
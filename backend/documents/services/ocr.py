@@ -0,0 +1,8 @@
+import pytesseract
+from PIL import Image
+
+
+def image_to_text(file_path):
+    """OCR a single-page image file"""
+    with Image.open(file_path) as image:
+        return pytesseract.image_to_string(image)
@@ -0,0 +1,26 @@
+import pdfplumber
+from backend.timing import span
+
+
+def iter_pdf_lines(file_path):
+    """Yield the stripped, non-empty text lines of a PDF one page at a time
+
+    Each page's parsed layout is dropped as soon as its text is read, so
+    memory stays bounded by the largest page rather than the whole document.
+    Stopping iteration early skips the remaining pages entirely.
+    """
+    with span('pdf-open'):
+        pdf = pdfplumber.open(file_path)
+    with pdf:
+        for page in pdf.pages:
+            with span('pdf-text'):
+                # Image-only pages have no text layer
+                text = page.extract_text() or ''
+                page.flush_cache()
+                # extract_text memoizes the page's text map outside of flush_cache
+                if hasattr(page, 'get_textmap'):
+                    page.get_textmap.cache_clear()
+            for line in text.splitlines():
+                line = line.strip()
+                if line:
+                    yield line
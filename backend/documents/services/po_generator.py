@@ -1,19 +1,44 @@
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
-from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib import colors
 from io import BytesIO
-from requests.models import PurchaseRequest
+from backend.metrics import PO_RENDER_SECONDS
+from backend.timing import span
 
 
 def generate_po(purchase_request):
     """Generate a Purchase Order PDF from approved request"""
+    from requests.models import PurchaseRequest
     if not isinstance(purchase_request, PurchaseRequest):
         return None
 
+    # Save file
+    file_path = f'purchase_orders/po_{purchase_request.id}.pdf'
+    file_content = ContentFile(render_po(po_context(purchase_request)))
+    return default_storage.save(file_path, file_content)
+
+
+def po_context(purchase_request):
+    """Everything render_po needs, as plain JSON-serializable data"""
+    vendor = (purchase_request.proforma_data or {}).get('vendor_name') or 'Extracted from Proforma'
+    return {
+        'po_number': f'PO-{purchase_request.id:04d}',
+        'date': purchase_request.created_at.strftime('%Y-%m-%d'),
+        'vendor': vendor,
+        'requested_by': purchase_request.created_by.get_full_name(),
+        'amount': str(purchase_request.amount),
+        'items': [
+            [item.item_name, str(item.quantity), str(item.price), str(item.total)]
+            for item in purchase_request.items.all()
+        ],
+    }
+
+
+def render_po(context):
+    """Render the PO PDF and return its bytes. Does not touch the database."""
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter)
     styles = getSampleStyleSheet()
@@ -26,11 +51,11 @@ def generate_po(purchase_request):
 
     # PO Details
     po_data = [
-        ['PO Number:', f'PO-{purchase_request.id:04d}'],
-        ['Date:', purchase_request.created_at.strftime('%Y-%m-%d')],
-        ['Vendor:', 'Extracted from Proforma'],  # TODO: Use extracted vendor
-        ['Requested By:', purchase_request.created_by.get_full_name()],
-        ['Amount:', f'${purchase_request.amount}'],
+        ['PO Number:', context['po_number']],
+        ['Date:', context['date']],
+        ['Vendor:', context['vendor']],
+        ['Requested By:', context['requested_by']],
+        ['Amount:', f"${context['amount']}"],
     ]
 
     po_table = Table(po_data, colWidths=[100, 300])
@@ -48,14 +73,14 @@ def generate_po(purchase_request):
     story.append(Spacer(1, 20))
 
     # Items
-    if purchase_request.items.exists():
+    if context['items']:
         items_data = [['Item', 'Quantity', 'Price', 'Total']]
-        for item in purchase_request.items.all():
+        for item_name, quantity, price, total in context['items']:
             items_data.append([
-                item.item_name,
-                str(item.quantity),
-                f'${item.price}',
-                f'${item.total}'
+                item_name,
+                quantity,
+                f'${price}',
+                f'${total}'
             ])
 
         items_table = Table(items_data, colWidths=[200, 80, 80, 80])
@@ -71,15 +96,6 @@ def generate_po(purchase_request):
         ]))
         story.append(items_table)
 
-    doc.build(story)
-
-    # Save to file
-    buffer.seek(0)
-    file_name = f'po_{purchase_request.id}.pdf'
-    file_path = f'purchase_orders/{file_name}'
-
-    # Save file
-    file_content = ContentFile(buffer.getvalue())
-    saved_path = default_storage.save(file_path, file_content)
-
-    return saved_path
\ No newline at end of file
+    with span('po-render'), PO_RENDER_SECONDS.time():
+        doc.build(story)
+    return buffer.getvalue()
\ No newline at end of file
@@ -1,15 +1,36 @@
-import pdfplumber
-import pytesseract
-from PIL import Image
 import os
-import re
+import tempfile
 from decimal import Decimal
+from django.conf import settings
+from backend.metrics import EXTRACTION_SECONDS, OCR_PAGES
+from backend.timing import span
+from documents import engines
+from . import cache
+from .matching import match_items
+from .lines import HEADING, ITEM, SUBTOTAL_LINE, TOTAL_LINE, LineItem, classify
 
+# Bump whenever parsing changes so cached results are recomputed
+EXTRACTOR_VERSION = 3
 
-def validate_receipt(receipt_file, purchase_request):
-    """Validate receipt against purchase order"""
+
+def validate_receipt(receipt_file, purchase_request, match_threshold=None):
+    """Validate receipt against purchase order
+
+    PO items are matched to receipt lines by trigram similarity, so OCR noise
+    and abbreviations above match_threshold (0-1) still count as a match.
+    """
     if hasattr(receipt_file, 'path'):
         file_path = receipt_file.path
+    elif hasattr(receipt_file, 'temporary_file_path'):
+        file_path = receipt_file.temporary_file_path()
+    elif hasattr(receipt_file, 'chunks'):
+        # In-memory upload, extractors need a real file
+        suffix = os.path.splitext(receipt_file.name)[1]
+        with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+            for chunk in receipt_file.chunks():
+                tmp.write(chunk)
+            tmp.flush()
+            return validate_receipt(tmp.name, purchase_request, match_threshold)
     else:
         file_path = receipt_file
 
@@ -22,6 +43,13 @@ def validate_receipt(receipt_file, purchase_request):
 
     # Extract data from receipt
     extracted_data = extract_receipt_data(file_path)
+    return compare_receipt(extracted_data, purchase_request, match_threshold)
+
+
+def compare_receipt(extracted_data, purchase_request, match_threshold=None):
+    """Compare extracted receipt data with the PO. Only reads purchase_request.items."""
+    if match_threshold is None:
+        match_threshold = getattr(settings, 'RECEIPT_MATCH_THRESHOLD', 0.5)
 
     # Compare with PO
     discrepancies = []
@@ -40,16 +68,23 @@ def validate_receipt(receipt_file, purchase_request):
     # TODO: Compare vendor names
 
     # Check items (if available)
-    if extracted_data.get('items') and purchase_request.items.exists():
-        po_items = {item.item_name.lower(): item.total for item in purchase_request.items.all()}
-        receipt_items = {item['name'].lower(): item['price'] for item in extracted_data['items']}
-
-        for item_name, po_price in po_items.items():
-            if item_name not in receipt_items:
+    po_items = list(purchase_request.items.all()) if extracted_data.get('items') else []
+    if po_items:
+        receipt_items = extracted_data['items']
+        with span('match'):
+            matches = match_items(
+                [item.item_name for item in po_items],
+                [item['name'] for item in receipt_items],
+                match_threshold
+            )
+
+        for po_item, match in zip(po_items, matches):
+            item_name = po_item.item_name
+            if match is None:
                 discrepancies.append(f'Item "{item_name}" not found in receipt')
                 is_valid = False
-            elif abs(po_price - receipt_items[item_name]) > Decimal('0.01'):
-                discrepancies.append(f'Price mismatch for "{item_name}": PO ${po_price}, Receipt ${receipt_items[item_name]}')
+            elif abs(po_item.total - receipt_items[match]['price']) > Decimal('0.01'):
+                discrepancies.append(f'Price mismatch for "{item_name}": PO ${po_item.total}, Receipt ${receipt_items[match]["price"]}')
                 is_valid = False
 
     return {
@@ -61,61 +96,38 @@ def validate_receipt(receipt_file, purchase_request):
 
 def extract_receipt_data(file_path):
     """Extract data from receipt"""
+    return cache.cached('receipt', EXTRACTOR_VERSION, file_path, _extract_receipt_data)
+
+
+def _extract_receipt_data(file_path):
     file_ext = os.path.splitext(file_path)[1].lower()
 
     if file_ext == '.pdf':
-        return extract_receipt_from_pdf(file_path)
+        with EXTRACTION_SECONDS.time(document='receipt', file_type='pdf'):
+            return extract_receipt_from_pdf(file_path)
     elif file_ext in ['.jpg', '.jpeg', '.png']:
-        return extract_receipt_from_image(file_path)
+        with EXTRACTION_SECONDS.time(document='receipt', file_type='image'):
+            return extract_receipt_from_image(file_path)
     else:
         return {}
 
 
 def extract_receipt_from_pdf(file_path):
     """Extract receipt data from PDF"""
-    extracted_data = {
-        'vendor_name': '',
-        'items': [],
-        'total_amount': Decimal('0.00')
-    }
-
     try:
-        with pdfplumber.open(file_path) as pdf:
-            text = ''
-            for page in pdf.pages:
-                text += page.extract_text() + '\n'
-
-            # Parse receipt text
-            lines = text.split('\n')
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-
-                # Look for total
-                if 'total' in line.lower():
-                    amount_match = re.search(r'(\d+\.\d{2})', line)
-                    if amount_match:
-                        extracted_data['total_amount'] = Decimal(amount_match.group(1))
-
-                # Look for items
-                elif re.search(r'\d+\.\d{2}', line) and len(line.split()) > 2:
-                    item_data = parse_receipt_item_line(line)
-                    if item_data:
-                        extracted_data['items'].append(item_data)
-
+        return parse_receipt_lines(engines.get('pdf_text')(file_path))
     except Exception as e:
         print(f"Error extracting receipt from PDF: {e}")
-
-    return extracted_data
+        return parse_receipt_lines([])
 
 
 def extract_receipt_from_image(file_path):
     """Extract receipt data from image"""
     try:
-        image = Image.open(file_path)
-        text = pytesseract.image_to_string(image)
-        # Similar parsing logic
+        with span('ocr'):
+            text = engines.get('ocr')(file_path)
+        OCR_PAGES.inc(document='receipt')
+        # Same parsing as PDF
         return extract_receipt_from_pdf_text(text)
     except Exception as e:
         print(f"Error extracting receipt from image: {e}")
@@ -124,28 +136,33 @@ def extract_receipt_from_image(file_path):
 
 def extract_receipt_from_pdf_text(text):
     """Parse receipt text"""
+    return parse_receipt_lines(text.splitlines())
+
+
+def parse_receipt_lines(lines):
+    """Single pass over the receipt lines"""
     extracted_data = {
         'vendor_name': '',
         'items': [],
         'total_amount': Decimal('0.00')
     }
-
-    lines = text.split('\n')
-    for line in lines:
-        # Similar logic as PDF
-        pass
-
+    items = []
+
+    with span('parse'):
+        for line in map(classify, lines):
+            if line is None:
+                continue
+            if line.kind is HEADING and not extracted_data['vendor_name']:
+                extracted_data['vendor_name'] = line.text
+            # Subtotals may be followed by tax lines, the grand total ends the receipt
+            elif line.kind is SUBTOTAL_LINE:
+                extracted_data['total_amount'] = line.amount
+            elif line.kind is TOTAL_LINE:
+                extracted_data['total_amount'] = line.amount
+                break
+            # Receipt items need a description besides the price
+            elif line.kind is ITEM and line.words > 2:
+                items.append(LineItem(line.label, line.amount))
+
+    extracted_data['items'] = [{'name': item.name, 'price': item.price} for item in items]
     return extracted_data
-
-
-def parse_receipt_item_line(line):
-    """Parse receipt item line"""
-    price_match = re.search(r'(\d+\.\d{2})', line)
-    if price_match:
-        price = Decimal(price_match.group(1))
-        name = line[:price_match.start()].strip()
-        return {
-            'name': name,
-            'price': price
-        }
-    return None
\ No newline at end of file
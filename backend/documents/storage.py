@@ -0,0 +1,187 @@
+"""Content-addressed storage for uploaded and generated documents.
+
+Files are stored once per distinct content under
+``blobs/<sha[:2]>/<sha[2:4]>/<sha><ext>`` in MEDIA_ROOT and the name handed
+back to the FileField is ``<upload_to>/<sha><ext>``, so re-uploading the same
+vendor quote or receipt, or attaching it to several requests, costs no extra
+disk. The extension is part of the key because the extractors dispatch on it.
+
+The SHA-256 is computed while the upload streams in (see documents.uploads)
+or while the content is copied next to the blobs, never by reading the file
+a second time. Each save adds a reference to the Blob row and each delete
+drops one; nothing is removed from disk until ``manage.py gc_blobs`` finds a
+blob with no references left. Names that are not content addresses (files
+stored before this backend) behave as in FileSystemStorage.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+from urllib.parse import urljoin
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils._os import safe_join
+from django.utils.encoding import filepath_to_uri
+
+BLOB_DIR = 'blobs'
+# Spooled copies wait here, on the same filesystem, before being renamed into place
+TMP_DIR = '.tmp'
+KEY_RE = re.compile(r'^(?P<sha256>[0-9a-f]{64})(?P<ext>\.[0-9a-z]{1,10})?$')
+EXT_RE = re.compile(r'^\.[0-9a-z]{1,10}$')
+
+
+def blob_key(name):
+    """'<sha><ext>' when name is a content address, else None"""
+    if not name:
+        return None
+    basename = posixpath.basename(name)
+    return basename if KEY_RE.match(basename) else None
+
+
+def file_fields():
+    """(model, field name) for every FileField stored in a ContentAddressedStorage"""
+    return [
+        (model, field.name)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+def referenced_keys():
+    """Number of stored file names pointing at each blob key"""
+    counts = {}
+    for model, field_name in file_fields():
+        names = model._default_manager.exclude(**{f'{field_name}__isnull': True}).exclude(**{field_name: ''})
+        for name in names.values_list(field_name, flat=True).iterator(chunk_size=2000):
+            key = blob_key(name)
+            if key is not None:
+                counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def blob_path(self, key):
+        return safe_join(self.location, BLOB_DIR, key[:2], key[2:4], key)
+
+    def tmp_dir(self):
+        return os.path.join(self.location, BLOB_DIR, TMP_DIR)
+
+    def path(self, name):
+        key = blob_key(name)
+        if key is None:
+            return super().path(name)
+        return self.blob_path(key)
+
+    def url(self, name):
+        key = blob_key(name)
+        if key is None:
+            return super().url(name)
+        return urljoin(self.base_url, filepath_to_uri(posixpath.join(BLOB_DIR, key[:2], key[2:4], key)))
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content in _save, identical bytes share it
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        ext = os.path.splitext(name)[1].lower()
+        if not EXT_RE.match(ext):
+            ext = ''
+
+        # Set by the hashing upload handlers while the request body was read
+        sha256 = getattr(content, 'sha256', None)
+        tmp_path = None
+        if sha256 is None:
+            sha256, tmp_path = self._spool(content, hash_content=True)
+            size = os.path.getsize(tmp_path)
+        else:
+            size = content.size
+        key = sha256 + ext
+
+        # Take the reference before looking at the disk: gc_blobs removes a
+        # blob under a lock on its row, only while the row has no references
+        self.retain(key, size)
+        try:
+            blob_path = self.blob_path(key)
+            if not os.path.exists(blob_path):
+                if tmp_path is None:
+                    tmp_path = self._spool(content)[1]
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                # Atomic, a concurrent save of the same bytes renames identical content
+                os.replace(tmp_path, blob_path)
+                tmp_path = None
+        except BaseException:
+            self.release(key)
+            raise
+        finally:
+            if tmp_path is not None:
+                os.remove(tmp_path)
+        return posixpath.join(directory, key)
+
+    def _spool(self, content, hash_content=False):
+        """Copy content next to the blobs, hashing it on the way when asked"""
+        os.makedirs(self.tmp_dir(), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir())
+        digest = hashlib.sha256() if hash_content else None
+        try:
+            if hasattr(content, 'temporary_file_path') and not hash_content:
+                # Already on disk: a rename when it is on the same filesystem
+                os.close(fd)
+                shutil.move(content.temporary_file_path(), tmp_path)
+            else:
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in content.chunks():
+                        if digest is not None:
+                            digest.update(chunk)
+                        f.write(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return digest.hexdigest() if digest is not None else None, tmp_path
+
+    def delete(self, name):
+        key = blob_key(name)
+        if key is None:
+            return super().delete(name)
+        # The blob itself stays until gc_blobs collects it
+        self.release(key)
+
+    def retain(self, key, size):
+        from .models import Blob
+        now = timezone.now()
+        if Blob.objects.filter(key=key).update(refcount=F('refcount') + 1, updated_at=now):
+            return
+        try:
+            with transaction.atomic():
+                Blob.objects.create(key=key, size=size, refcount=1, updated_at=now)
+        except IntegrityError:
+            # Created by a concurrent save of the same bytes
+            Blob.objects.filter(key=key).update(refcount=F('refcount') + 1, updated_at=now)
+
+    def release(self, key):
+        from .models import Blob
+        Blob.objects.filter(key=key, refcount__gt=0).update(refcount=F('refcount') - 1, updated_at=timezone.now())
+
+    def iter_blobs(self):
+        """(key, path) of every blob on disk"""
+        root = os.path.join(self.location, BLOB_DIR)
+        if not os.path.isdir(root):
+            return
+        for outer in os.scandir(root):
+            if not outer.is_dir() or outer.name == TMP_DIR:
+                continue
+            for inner in os.scandir(outer.path):
+                if not inner.is_dir():
+                    continue
+                for entry in os.scandir(inner.path):
+                    if entry.is_file() and KEY_RE.match(entry.name):
+                        yield entry.name, entry.path
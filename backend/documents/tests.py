@@ -0,0 +1,138 @@
+import os
+import signal
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from requests.models import PurchaseRequest
+from . import jobs
+from .models import DocumentJob
+from .services import cache, extract
+
+
+def crash(kind, args):
+    """Stands in for jobs.execute: the pool process dies the way an OOM kill would"""
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+class ProcessDocumentJobsTests(TransactionTestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='staff', password='pass', role='staff')
+        purchase_request = PurchaseRequest.objects.create(
+            title='Laptops', description='Two laptops', amount='2400.00', created_by=user
+        )
+        self.job_ids = [
+            jobs.enqueue('render_po', purchase_request, {}).id
+            for _ in range(2)
+        ]
+
+    def process(self):
+        with mock.patch.object(jobs, 'execute', crash):
+            call_command('process_document_jobs', '--once', '--workers', '2', '--poll-interval', '0.1', stdout=StringIO())
+
+    def test_jobs_on_a_broken_pool_are_requeued(self):
+        self.process()
+
+        for job in DocumentJob.objects.filter(id__in=self.job_ids):
+            self.assertEqual(job.status, 'queued')
+            self.assertEqual(job.attempts, 1)
+            self.assertIsNone(job.locked_at)
+            self.assertTrue(job.error)
+
+    def test_pool_is_restarted_after_breaking(self):
+        # Retry straight away: every attempt needs a working pool to be submitted
+        with mock.patch.object(jobs, 'RETRY_DELAY', timedelta(0)):
+            self.process()
+
+        for job in DocumentJob.objects.filter(id__in=self.job_ids):
+            self.assertEqual(job.status, 'failed')
+            self.assertEqual(job.attempts, job.max_attempts)
+
+
+class ApplyExtractionTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='staff', role='staff')
+        self.purchase_request = PurchaseRequest.objects.create(
+            title='Laptops', description='Two laptops', amount='2400.00', created_by=user,
+            proforma_file='proformas/first.pdf'
+        )
+        self.job = jobs.enqueue('extract_proforma', self.purchase_request, {'file': 'proformas/first.pdf', 'path': ''})
+
+    def test_result_lands_on_the_extracted_proforma(self):
+        jobs.complete(self.job, {'vendor_name': 'Acme'})
+        self.purchase_request.refresh_from_db()
+        self.assertEqual(self.purchase_request.proforma_data, {'vendor_name': 'Acme'})
+
+    def test_result_for_a_replaced_proforma_is_dropped(self):
+        # Re-uploaded while the job was running, after claim() loaded the request
+        PurchaseRequest.objects.filter(id=self.purchase_request.id).update(
+            proforma_file='proformas/second.pdf', proforma_data=None
+        )
+        jobs.complete(self.job, {'vendor_name': 'Acme'})
+        self.purchase_request.refresh_from_db()
+        self.assertIsNone(self.purchase_request.proforma_data)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'done')
+
+
+class ExtractionCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = Path(tmp.name) / 'cache'
+        self.enterContext(override_settings(DOCUMENT_CACHE_DIR=str(self.cache_dir), DOCUMENT_CACHE_MAX_ENTRIES=2))
+        self.files = []
+        for i in range(5):
+            path = Path(tmp.name) / f'proforma-{i}.pdf'
+            path.write_bytes(b'%PDF-' + bytes([i]))
+            self.files.append(str(path))
+
+    def entries(self):
+        return list(self.cache_dir.glob('*/*.json'))
+
+    def test_failed_extraction_is_not_cached(self):
+        def broken(file_path):
+            raise ValueError('not a PDF')
+
+        # The extractor prints the error it swallows
+        with mock.patch.dict('documents.engines._resolved', {'pdf_text': broken}), mock.patch('builtins.print'):
+            data = cache.cached('proforma', 1, self.files[0], extract.extract_from_pdf)
+
+        self.assertEqual(data['items'], [])
+        self.assertEqual(self.entries(), [])
+
+    def test_eviction_runs_every_few_writes(self):
+        compute = lambda file_path: {'vendor_name': file_path}
+        with mock.patch.object(cache, 'EVICT_EVERY', 5), mock.patch.object(cache, '_writes', 0):
+            for file_path in self.files[:4]:
+                cache.cached('proforma', 1, file_path, compute)
+            self.assertEqual(len(self.entries()), 4)
+
+            cache.cached('proforma', 1, self.files[4], compute)
+            self.assertEqual(len(self.entries()), 2)
+
+    def test_eviction_skips_entries_removed_meanwhile(self):
+        compute = lambda file_path: {'vendor_name': file_path}
+        for file_path in self.files:
+            cache.cached('proforma', 1, file_path, compute)
+        scandir = os.scandir
+        removed = []
+
+        def listing_then_eviction(path):
+            entries = list(scandir(path))
+            # Another process evicts an entry after this one listed its bucket
+            for entry in entries:
+                if entry.name.endswith('.json') and not removed:
+                    os.remove(entry.path)
+                    removed.append(entry.path)
+            return iter(entries)
+
+        with mock.patch.object(cache.os, 'scandir', listing_then_eviction):
+            cache.evict(self.cache_dir, max_entries=1)
+        self.assertEqual(len(self.entries()), 1)
@@ -1,9 +1,9 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework import status
 from requests.models import PurchaseRequest
-from .serializers import ProformaExtractionSerializer, ReceiptValidationResultSerializer
+from .models import DocumentJob
+from .serializers import ProformaExtractionSerializer, ReceiptValidationResultSerializer, DocumentJobSerializer
 from .services import extract, receipt_validation
 
 
@@ -44,4 +44,21 @@ def validate_receipt(request, request_id):
     serializer = ReceiptValidationResultSerializer(data=result)
     if serializer.is_valid():
         return Response(serializer.validated_data)
-    return Response(serializer.errors, status=400)
\ No newline at end of file
+    return Response(serializer.errors, status=400)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def job_status(request, job_id):
+    jobs = DocumentJob.objects.all()
+    if request.user.role == 'staff':
+        # Staff only see jobs for their own requests
+        jobs = jobs.filter(purchase_request__created_by=request.user)
+
+    try:
+        job = jobs.get(id=job_id)
+    except DocumentJob.DoesNotExist:
+        return Response({'error': 'Job not found'}, status=404)
+
+    serializer = DocumentJobSerializer(job)
+    return Response(serializer.data)
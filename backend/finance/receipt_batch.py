@@ -0,0 +1,120 @@
+"""Bulk receipt validation streamed as NDJSON.
+
+Extraction for every receipt is submitted to the shared document pool up
+front, then results are written out in completion order, one JSON object
+per line, so one slow file never holds back the others.
+"""
+from concurrent.futures import as_completed
+import json
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from requests.models import PurchaseRequest
+from documents.pool import get_pool
+from documents.services import receipt_validation
+
+LEADING_ID = re.compile(r'^(\d+)')
+RECEIPT_EXTENSIONS = {'.pdf', '.jpg', '.jpeg', '.png'}
+
+
+def _line(data):
+    return json.dumps(data, cls=DjangoJSONEncoder) + '\n'
+
+
+def receipts_from_zip(archive, mapping, tmp_dir):
+    """Unpack a zip of receipts into tmp_dir and map each one to a request id
+
+    Members are looked up in mapping (file name -> request id) first, then
+    fall back to the leading digits of the file name, e.g. ``42-receipt.pdf``.
+    """
+    max_size = getattr(settings, 'RECEIPT_BATCH_MAX_UNZIPPED_SIZE', 500 * 1024 * 1024)
+    receipts = []
+    errors = []
+    with zipfile.ZipFile(archive) as zf:
+        members = [member for member in zf.infolist() if not member.is_dir()]
+        if sum(member.file_size for member in members) > max_size:
+            raise ValueError('Archive is too large once unpacked')
+
+        for index, member in enumerate(members):
+            name = os.path.basename(member.filename)
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in RECEIPT_EXTENSIONS:
+                errors.append({'file': member.filename, 'error': 'Unsupported file type'})
+                continue
+
+            request_id = mapping.get(member.filename, mapping.get(name))
+            if request_id is None:
+                match = LEADING_ID.match(name)
+                if not match:
+                    errors.append({'file': member.filename, 'error': 'No request id for this file'})
+                    continue
+                request_id = int(match.group(1))
+
+            # Never trust member names for the path on disk
+            path = os.path.join(tmp_dir, f'{index}{ext}')
+            with zf.open(member) as src, open(path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            receipts.append((int(request_id), path))
+    return receipts, errors
+
+
+def stream_results(receipts, errors=(), tmp_dir=None):
+    """Yield one NDJSON line per receipt as soon as its validation finishes"""
+    try:
+        for error in errors:
+            yield _line(error)
+
+        requests = PurchaseRequest.objects.filter(
+            id__in={request_id for request_id, _ in receipts},
+            status='approved'
+        ).prefetch_related('items').in_bulk()
+
+        pool = get_pool()
+        futures = {}
+        for request_id, path in receipts:
+            purchase_request = requests.get(request_id)
+            if purchase_request is None:
+                yield _line({'request_id': request_id, 'error': 'Purchase request not found or not approved'})
+                continue
+            if path is None:
+                if not purchase_request.receipt_file:
+                    yield _line({'request_id': request_id, 'error': 'No receipt file uploaded'})
+                    continue
+                path = purchase_request.receipt_file.path
+            if not os.path.exists(path):
+                yield _line({'request_id': request_id, 'error': 'Receipt file not found'})
+                continue
+            future = pool.submit(receipt_validation.extract_receipt_data, path)
+            futures[future] = purchase_request
+
+        for future in as_completed(futures):
+            purchase_request = futures[future]
+            try:
+                result = receipt_validation.compare_receipt(future.result(), purchase_request)
+            except Exception as e:
+                yield _line({'request_id': purchase_request.id, 'error': str(e)})
+                continue
+            yield _line({'request_id': purchase_request.id, **result})
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def start_batch(request_ids=None, archive=None, mapping=None):
+    """Prepare the receipts and return the NDJSON line generator"""
+    if archive is None:
+        # No path means the receipt already stored on the request
+        return stream_results([(request_id, None) for request_id in request_ids])
+
+    tmp_dir = tempfile.mkdtemp(prefix='receipts-')
+    try:
+        receipts, errors = receipts_from_zip(archive, mapping or {}, tmp_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return stream_results(receipts, errors, tmp_dir)
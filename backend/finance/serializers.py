@@ -23,4 +23,36 @@ class ReceiptValidationSerializer(serializers.Serializer):
             request = PurchaseRequest.objects.get(id=value, status='approved')
             return value
         except PurchaseRequest.DoesNotExist:
-            raise serializers.ValidationError("Purchase request not found or not approved")
\ No newline at end of file
+            raise serializers.ValidationError("Purchase request not found or not approved")
+
+
+class BatchReceiptValidationSerializer(serializers.Serializer):
+    request_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        max_length=1000
+    )
+    receipts = serializers.FileField(required=False, help_text="Zip of receipt files")
+    mapping = serializers.JSONField(
+        required=False,
+        help_text="File name in the zip -> purchase request id"
+    )
+
+    def validate_mapping(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("Must be an object of file name to request id")
+        request_id = serializers.IntegerField(min_value=1)
+        mapping, errors = {}, {}
+        for name, item in value.items():
+            try:
+                mapping[name] = request_id.run_validation(item)
+            except serializers.ValidationError as exc:
+                errors[name] = exc.detail
+        if errors:
+            raise serializers.ValidationError(errors)
+        return mapping
+
+    def validate(self, attrs):
+        if bool(attrs.get('request_ids')) == bool(attrs.get('receipts')):
+            raise serializers.ValidationError("Provide either request_ids or a receipts zip")
+        return attrs
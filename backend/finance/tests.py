@@ -0,0 +1,32 @@
+import io
+import json
+import zipfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase
+
+from accounts.tokens import UserAccessToken
+
+
+class BatchReceiptValidationTests(TestCase):
+    def setUp(self):
+        finance = get_user_model().objects.create_user(username='finance', role='finance')
+        # Not DRF's APIClient: rest_framework.test imports the requests package this app shadows
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {UserAccessToken.for_user(finance)}')
+
+    def post(self, mapping):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('receipt.pdf', b'%PDF-receipt')
+        return self.client.post('/api/validate_receipts/', {
+            'receipts': SimpleUploadedFile('receipts.zip', buffer.getvalue(), content_type='application/zip'),
+            'mapping': json.dumps(mapping),
+        })
+
+    def test_mapping_values_must_be_request_ids(self):
+        for value in ([1], {'id': 1}, 'abc', 0):
+            with self.subTest(value=value):
+                response = self.post({'receipt.pdf': value})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('receipt.pdf', response.json()['mapping'])
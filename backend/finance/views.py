@@ -1,31 +1,47 @@
+import zipfile
+
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from requests.models import PurchaseRequest
-from .serializers import PurchaseOrderSerializer, ReceiptValidationSerializer
+from requests.pagination import KeysetPagination
+from requests.query_budget import QueryBudgetMixin
+from .serializers import PurchaseOrderSerializer, ReceiptValidationSerializer, BatchReceiptValidationSerializer
 from .permissions import IsFinanceUser
+from . import receipt_batch
 from documents.services import receipt_validation
 
 
-class FinanceViewSet(viewsets.ModelViewSet):
+class FinanceViewSet(QueryBudgetMixin, viewsets.ModelViewSet):
     queryset = PurchaseRequest.objects.filter(status='approved')
     serializer_class = PurchaseOrderSerializer
     permission_classes = [IsAuthenticated, IsFinanceUser]
+    pagination_class = KeysetPagination
+    # PurchaseOrderSerializer only needs created_by on top of the request row
+    query_budgets = {
+        'list': 2,
+        'retrieve': 2,
+        'approved_requests': 2,
+        'purchase_orders': 2,
+    }
+
+    def get_queryset(self):
+        return PurchaseRequest.objects.filter(status='approved').select_related('created_by')
 
     @action(detail=False, methods=['get'])
     def approved_requests(self, request):
-        requests = PurchaseRequest.objects.filter(status='approved')
-        serializer = PurchaseOrderSerializer(requests, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = PurchaseOrderSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def purchase_orders(self, request):
-        requests = PurchaseRequest.objects.filter(
-            status='approved'
-        ).exclude(purchase_order_file='')
-        serializer = PurchaseOrderSerializer(requests, many=True)
-        return Response(serializer.data)
+        requests = self.get_queryset().exclude(purchase_order_file='').exclude(purchase_order_file__isnull=True)
+        page = self.paginate_queryset(requests)
+        serializer = PurchaseOrderSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post'])
     def validate_receipt(self, request, pk=None):
@@ -42,4 +58,25 @@ class FinanceViewSet(viewsets.ModelViewSet):
                 purchase_request
             )
             return Response(result)
-        return Response(serializer.errors, status=400)
\ No newline at end of file
+        return Response(serializer.errors, status=400)
+
+    @action(detail=False, methods=['post'])
+    def validate_receipts(self, request):
+        """Validate many receipts at once, streaming one JSON line per result"""
+        serializer = BatchReceiptValidationSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        try:
+            lines = receipt_batch.start_batch(
+                request_ids=serializer.validated_data.get('request_ids'),
+                archive=serializer.validated_data.get('receipts'),
+                mapping=serializer.validated_data.get('mapping')
+            )
+        except (zipfile.BadZipFile, ValueError) as e:
+            return Response({'error': str(e)}, status=400)
+
+        response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+        # Ask nginx not to buffer so each line reaches the client as it is produced
+        response['X-Accel-Buffering'] = 'no'
+        return response
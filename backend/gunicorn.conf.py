@@ -0,0 +1,18 @@
+"""Gunicorn hooks, loaded automatically when gunicorn starts in this directory"""
+
+
+def on_starting(server):
+    # Metric files from a previous run would be added to this run's counters
+    from backend import metrics
+    metrics.clear_multiproc_dir()
+
+
+def post_worker_init(worker):
+    # Document engines load on first use unless DOCUMENT_ENGINES_WARM_UP is set
+    from documents import engines
+    engines.warm_up_if_configured()
+
+
+def child_exit(server, worker):
+    from backend import metrics
+    metrics.retire(worker.pid)
@@ -0,0 +1,51 @@
+"""Chunked bulk creation of purchase requests and their items.
+
+Shared by the bulk-create endpoint and the import_requests command. Every
+chunk costs two INSERT statements (requests, then items) in one transaction,
+whatever the number of rows in it.
+"""
+from itertools import islice
+
+from django.db import transaction
+
+from .models import PurchaseRequest, RequestItem
+
+BATCH_SIZE = 500
+
+
+def chunked(rows, size):
+    """Yield lists of at most ``size`` rows without materializing ``rows``"""
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def create_chunk(rows):
+    """Insert one chunk of requests.
+
+    Each row is a dict with ``title``, ``description``, ``amount``,
+    ``created_by_id`` and an optional list of ``items`` (``item_name``,
+    ``price``, ``quantity``). Returns the created requests with their pks set.
+    """
+    with transaction.atomic():
+        requests = PurchaseRequest.objects.bulk_create([
+            PurchaseRequest(
+                title=row['title'],
+                description=row.get('description', ''),
+                amount=row['amount'],
+                created_by_id=row['created_by_id'],
+            )
+            for row in rows
+        ])
+        RequestItem.objects.bulk_create([
+            RequestItem(purchase_request=request, **item)
+            for request, row in zip(requests, rows)
+            for item in row.get('items', [])
+        ], batch_size=BATCH_SIZE)
+    return requests
+
+
+def create_requests(rows, batch_size=BATCH_SIZE):
+    """Insert ``rows`` chunk by chunk, yielding the requests of each committed chunk"""
+    for chunk in chunked(rows, batch_size):
+        yield create_chunk(chunk)
@@ -0,0 +1,443 @@
+import io
+import json
+import logging
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import zipfile
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.utils import timezone
+from accounts.tokens import UserAccessToken
+from accounts.management.commands.generate_load_data import PREFIX, document_pdf
+from documents.models import DocumentJob
+from requests import bulk
+from requests.models import PurchaseRequest
+from requests.query_budget import QueryCounter
+
+User = get_user_model()
+
+# Requests created by the benchmark itself, removed afterwards
+MARKER = '[bench]'
+
+
+class InProcess:
+    """Drive the app through the Django test client, counting SQL per call"""
+    name = 'in-process'
+    counts_queries = True
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def request(self, method, path, token=None, data=None, files=False):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client(HTTP_HOST='localhost')
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        if data is not None and not files:
+            headers['content_type'] = 'application/json'
+
+        with QueryCounter() as counter:
+            start = time.perf_counter()
+            response = getattr(client, method.lower())(path, data, **headers)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        return response.status_code, elapsed, counter.count
+
+    def close(self):
+        connection.close()
+
+
+class Http:
+    """Drive a running server over HTTP, SQL counts are not visible from here"""
+    name = 'http'
+    counts_queries = False
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, token=None, data=None, files=False):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        body = None
+        if files:
+            body = encode_multipart(BOUNDARY, data)
+            headers['Content-Type'] = MULTIPART_CONTENT
+        elif data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                response.read()
+                code = response.status
+        except urllib.error.HTTPError as exc:
+            exc.read()
+            code = exc.code
+        return code, time.perf_counter() - start, None
+
+    def close(self):
+        pass
+
+
+class Gunicorn(Http):
+    """Start a local gunicorn on a free port for the duration of the run"""
+    name = 'gunicorn'
+
+    def __init__(self, workers):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        self.process = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn', 'backend.wsgi:application',
+                '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--log-level', 'warning',
+            ],
+            cwd=settings.BASE_DIR,
+        )
+        super().__init__(f'http://127.0.0.1:{port}')
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError('gunicorn exited during startup')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        self.shutdown()
+        raise CommandError('gunicorn did not start listening within 30s')
+
+    def shutdown(self):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every API endpoint in-process or against gunicorn and compare with a stored baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Size of the generated dataset')
+        parser.add_argument('--regenerate', action='store_true', help='Regenerate the dataset even if one exists')
+        parser.add_argument('--iterations', type=int, default=30, help='Timed calls per endpoint')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed calls per endpoint')
+        parser.add_argument('--concurrency', type=int, default=1, help='Client threads per endpoint')
+        parser.add_argument('--only', help='Comma separated endpoint name prefixes, e.g. requests.,finance.detail')
+        target = parser.add_mutually_exclusive_group()
+        target.add_argument('--gunicorn', action='store_true', help='Start a local gunicorn and benchmark over HTTP')
+        target.add_argument('--url', help='Benchmark an already running server, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+        parser.add_argument('--output', help='Write results to this JSON file')
+        parser.add_argument('--baseline', help='Compare with a previous --output file')
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.5,
+            help='Allowed p95 slowdown against the baseline before failing (0.5 = 50%%)'
+        )
+        parser.add_argument(
+            '--min-delta-ms',
+            type=float,
+            default=2.0,
+            help='Ignore p95 slowdowns smaller than this, sub-millisecond endpoints are mostly noise'
+        )
+
+    def handle(self, *args, **options):
+        self.prepare_dataset(options['requests'], options['regenerate'])
+        fixtures = self.create_fixtures(options['iterations'] + options['warmup'])
+        self.tokens = fixtures['tokens']
+
+        if options['gunicorn']:
+            transport = Gunicorn(options['workers'])
+        elif options['url']:
+            transport = Http(options['url'])
+        else:
+            transport = InProcess()
+
+        # Expected 4xx responses would otherwise flood the output
+        request_logger = logging.getLogger('django.request')
+        previous_level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            endpoints = self.endpoints(fixtures)
+            if options['only']:
+                prefixes = tuple(options['only'].split(','))
+                endpoints = [endpoint for endpoint in endpoints if endpoint[0].startswith(prefixes)]
+
+            self.stdout.write(
+                f"{transport.name}, {options['iterations']} calls x {options['concurrency']} thread(s) per endpoint"
+            )
+            self.stdout.write(
+                f"{'endpoint':<34} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'queries':>8} {'errors':>7}"
+            )
+            results = {}
+            for endpoint in endpoints:
+                results[endpoint[0]] = stats = self.run(transport, endpoint, options)
+                self.stdout.write(
+                    f"{endpoint[0]:<34} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} "
+                    f"{stats['throughput']:>8.1f} {stats['queries'] if stats['queries'] is not None else '-':>8} "
+                    f"{stats['errors']:>7}"
+                )
+        finally:
+            request_logger.setLevel(previous_level)
+            if isinstance(transport, Gunicorn):
+                transport.shutdown()
+            self.cleanup(fixtures)
+
+        report = {
+            'meta': {
+                'target': transport.name,
+                'dataset_requests': PurchaseRequest.objects.filter(created_by__username__startswith=PREFIX).count(),
+                'iterations': options['iterations'],
+                'concurrency': options['concurrency'],
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'timestamp': timezone.now().isoformat(),
+            },
+            'endpoints': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['baseline']:
+            self.compare(report, options['baseline'], options['tolerance'], options['min_delta_ms'])
+
+    def prepare_dataset(self, size, regenerate):
+        existing = PurchaseRequest.objects.filter(created_by__username__startswith=PREFIX).count()
+        if existing and not regenerate:
+            self.stdout.write(f'Using the existing dataset of {existing} generated requests')
+            return
+        call_command(
+            'generate_load_data',
+            requests=size,
+            users=max(20, size // 50),
+            seed=1,
+            pdfs=3,
+            clear=True,
+            stdout=io.StringIO()
+        )
+        self.stdout.write(f'Generated a dataset of {size} requests')
+
+    def create_fixtures(self, calls):
+        """Fresh requests for the endpoints that change state, so every call does real work"""
+        users = {
+            role: User.objects.filter(username__startswith=PREFIX, role=role).order_by('id').first()
+            for role in ['staff', 'approver_1', 'approver_2', 'finance']
+        }
+        if not all(users.values()):
+            raise CommandError('The generated dataset is missing a role, regenerate it with more --users')
+        tokens = {role: str(UserAccessToken.for_user(user)) for role, user in users.items()}
+
+        items = [('Laptop', Decimal('1200.00'), 1), ('Office Chair', Decimal('250.00'), 2)]
+        pdf = document_pdf('Benchmark proforma', 'TechCorp Solutions', [(name, price * qty) for name, price, qty in items])
+        proforma = default_storage.save('proformas/bench.pdf', ContentFile(pdf))
+        receipt = default_storage.save('receipts/bench.pdf', ContentFile(pdf))
+
+        def fresh(count, **fields):
+            rows = [
+                {
+                    'title': f'{MARKER} {i}',
+                    'description': 'Created by benchmark_api',
+                    'amount': Decimal('1700.00'),
+                    'created_by_id': users['staff'].id,
+                    'items': [{'item_name': name, 'price': price, 'quantity': qty} for name, price, qty in items],
+                }
+                for i in range(count)
+            ]
+            created = [request for chunk in bulk.create_requests(rows) for request in chunk]
+            ids = [request.id for request in created]
+            if fields:
+                PurchaseRequest.objects.filter(id__in=ids).update(**fields)
+            return ids
+
+        approved = fresh(1, status='approved', current_level=2, proforma_file=proforma, receipt_file=receipt)[0]
+        pending = fresh(1, proforma_file=proforma)[0]
+        job = DocumentJob.objects.create(kind='extract_proforma', purchase_request_id=pending, payload={})
+        return {
+            'users': users,
+            'tokens': tokens,
+            'pdf': pdf,
+            'files': [proforma, receipt],
+            'pending': pending,
+            'approved': approved,
+            'job': job.id,
+            'to_approve': iter(fresh(calls)),
+            'to_reject': iter(fresh(calls)),
+            'to_bulk_approve': iter(fresh(calls * 10)),
+        }
+
+    def endpoints(self, fixtures):
+        """(name, role, method, path or callable, body or callable, multipart)"""
+        pdf = fixtures['pdf']
+        pending, approved = fixtures['pending'], fixtures['approved']
+        staff = fixtures['users']['staff']
+        lock = threading.Lock()
+
+        def take(key, count=None):
+            with lock:
+                if count is None:
+                    return next(fixtures[key])
+                return [next(fixtures[key]) for _ in range(count)]
+
+        def upload(name):
+            return lambda: {'file': ContentFile(pdf, name=name)}
+
+        def receipts_zip():
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w') as archive:
+                archive.writestr(f'{approved}.pdf', pdf)
+            return {'receipts': ContentFile(buffer.getvalue(), name='receipts.zip')}
+
+        return [
+            ('auth.login', None, 'POST', '/api/auth/login/', {'username': staff.username, 'password': 'load123'}, False),
+            ('auth.profile', 'staff', 'GET', '/api/auth/profile/', None, False),
+            ('requests.list.staff', 'staff', 'GET', '/api/requests/', None, False),
+            ('requests.list.approver', 'approver_1', 'GET', '/api/requests/', None, False),
+            ('requests.detail', 'staff', 'GET', f'/api/requests/{pending}/', None, False),
+            ('requests.create', 'staff', 'POST', '/api/requests/', {
+                'title': f'{MARKER} created', 'description': 'Created by benchmark_api', 'amount': '100.00',
+                'items': [{'item_name': 'Toner', 'price': '50.00', 'quantity': 2}],
+            }, False),
+            ('requests.pending_approvals.l1', 'approver_1', 'GET', '/api/approvals/pending/', None, False),
+            ('requests.pending_approvals.l2', 'approver_2', 'GET', '/api/approvals/pending/', None, False),
+            ('requests.approve', 'approver_1', 'POST',
+             lambda: f"/api/requests/{take('to_approve')}/approve/", {'action': 'approve'}, False),
+            ('requests.reject', 'approver_1', 'POST',
+             lambda: f"/api/requests/{take('to_reject')}/reject/", {'action': 'reject'}, False),
+            ('requests.bulk_approve', 'approver_1', 'POST', '/api/requests/bulk-approve/',
+             lambda: {'ids': take('to_bulk_approve', 10)}, False),
+            ('requests.upload_proforma', 'staff', 'POST',
+             f'/api/requests/{pending}/upload_proforma/', upload('proforma.pdf'), True),
+            ('requests.upload_receipt', 'finance', 'POST',
+             f'/api/requests/{approved}/upload_receipt/', upload('receipt.pdf'), True),
+            ('documents.extract_proforma', 'staff', 'POST', f'/api/requests/{pending}/extract-proforma/', None, False),
+            ('documents.validate_receipt', 'finance', 'POST', f'/api/requests/{approved}/validate-receipt/', None, False),
+            ('documents.job_status', 'staff', 'GET', f"/api/documents/jobs/{fixtures['job']}/", None, False),
+            # No finance.list: /api/ resolves to the requests router's api-root, FinanceViewSet.list
+            # has no URL of its own and approved_requests serves the same listing
+            ('finance.detail', 'finance', 'GET', f'/api/{approved}/', None, False),
+            ('finance.approved_requests', 'finance', 'GET', '/api/approved_requests/', None, False),
+            ('finance.purchase_orders', 'finance', 'GET', '/api/purchase_orders/', None, False),
+            ('finance.validate_receipt', 'finance', 'POST', f'/api/{approved}/validate_receipt/',
+             lambda: {'receipt_file': ContentFile(pdf, name='receipt.pdf'), 'purchase_request_id': approved}, True),
+            ('finance.validate_receipts', 'finance', 'POST', '/api/validate_receipts/', receipts_zip, True),
+        ]
+
+    def run(self, transport, endpoint, options):
+        name, role, method, path, body, files = endpoint
+        token = self.tokens[role] if role else None
+        samples, queries, errors = [], [], 0
+        lock = threading.Lock()
+
+        def call():
+            nonlocal errors
+            status, elapsed, count = transport.request(
+                method,
+                path() if callable(path) else path,
+                token,
+                body() if callable(body) else body,
+                files
+            )
+            with lock:
+                samples.append(elapsed)
+                if count is not None:
+                    queries.append(count)
+                if status >= 400:
+                    errors += 1
+
+        for _ in range(options['warmup']):
+            call()
+        samples.clear()
+        queries.clear()
+        errors = 0
+
+        concurrency = max(1, options['concurrency'])
+        per_thread = [options['iterations'] // concurrency + (i < options['iterations'] % concurrency)
+                      for i in range(concurrency)]
+
+        def worker(calls):
+            try:
+                for _ in range(calls):
+                    call()
+            finally:
+                if concurrency > 1:
+                    transport.close()
+
+        started = time.perf_counter()
+        if concurrency == 1:
+            worker(per_thread[0])
+        else:
+            threads = [threading.Thread(target=worker, args=(calls,)) for calls in per_thread]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        wall = time.perf_counter() - started
+
+        ordered = sorted(samples)
+        return {
+            'p50_ms': percentile(ordered, 0.50) * 1000,
+            'p95_ms': percentile(ordered, 0.95) * 1000,
+            'p99_ms': percentile(ordered, 0.99) * 1000,
+            'mean_ms': statistics.fmean(ordered) * 1000,
+            'throughput': len(ordered) / wall,
+            'queries': max(queries) if queries else None,
+            'errors': errors,
+        }
+
+    def cleanup(self, fixtures):
+        PurchaseRequest.objects.filter(title__startswith=MARKER).delete()
+        for name in fixtures['files']:
+            default_storage.delete(name)
+
+    def compare(self, report, baseline_path, tolerance, min_delta_ms):
+        with open(baseline_path) as source:
+            baseline = json.load(source)
+
+        regressions = []
+        for name, current in report['endpoints'].items():
+            before = baseline['endpoints'].get(name)
+            if before is None:
+                continue
+            ratio = current['p95_ms'] / before['p95_ms'] if before['p95_ms'] else 1
+            notes = []
+            if ratio > 1 + tolerance and current['p95_ms'] - before['p95_ms'] >= min_delta_ms:
+                notes.append(f"p95 {before['p95_ms']:.1f} -> {current['p95_ms']:.1f} ms (x{ratio:.2f})")
+            if current['queries'] is not None and before.get('queries') is not None \
+                    and current['queries'] > before['queries']:
+                notes.append(f"queries {before['queries']} -> {current['queries']}")
+            if current['errors'] > before.get('errors', 0):
+                notes.append(f"errors {before.get('errors', 0)} -> {current['errors']}")
+            if notes:
+                regressions.append(f"{name}: {', '.join(notes)}")
+
+        if regressions:
+            for line in regressions:
+                self.stdout.write(self.style.ERROR(line))
+            raise CommandError(f'{len(regressions)} endpoint(s) regressed against {baseline_path}')
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline_path}'))
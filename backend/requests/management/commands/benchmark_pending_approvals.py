@@ -0,0 +1,71 @@
+from decimal import Decimal
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from accounts.tokens import UserAccessToken
+from requests.models import PurchaseRequest, Approval
+from requests.views import pending_approvals
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Measure query count and latency of the approver inbox as the pending table grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='10,100,1000,5000',
+            help='Comma separated numbers of pending requests to seed'
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        factory = RequestFactory()
+
+        self.stdout.write(f"{'pending':>10} {'role':>12} {'queries':>8} {'ms':>10}")
+
+        # Everything is seeded inside a transaction that is rolled back at the end
+        with transaction.atomic():
+            staff = User.objects.create_user(username='bench_staff', role='staff')
+            approver1 = User.objects.create_user(username='bench_approver1', role='approver_1')
+            approver2 = User.objects.create_user(username='bench_approver2', role='approver_2')
+
+            seeded = 0
+            for size in sizes:
+                requests = PurchaseRequest.objects.bulk_create([
+                    PurchaseRequest(
+                        title=f'Benchmark request {seeded + i}',
+                        description='Seeded by benchmark_pending_approvals',
+                        amount=Decimal('100.00'),
+                        created_by=staff,
+                        current_level=1 if i % 2 else 2
+                    )
+                    for i in range(size - seeded)
+                ])
+                # Half of the new requests already passed level 1
+                Approval.objects.bulk_create([
+                    Approval(purchase_request=r, approver=approver1, level=1, status='approved')
+                    for r in requests[::2]
+                ])
+                seeded = size
+
+                for user in (approver1, approver2):
+                    request = factory.get(
+                        '/api/approvals/pending/',
+                        HTTP_HOST='localhost',
+                        HTTP_AUTHORIZATION=f'Bearer {UserAccessToken.for_user(user)}'
+                    )
+
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        pending_approvals(request)
+                        elapsed = (time.perf_counter() - start) * 1000
+
+                    self.stdout.write(f'{size:>10} {user.role:>12} {len(queries):>8} {elapsed:>10.1f}')
+
+            transaction.set_rollback(True)
@@ -0,0 +1,102 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from accounts.tokens import UserAccessToken
+from requests.models import PurchaseRequest, Approval, RequestItem
+from requests.query_budget import QueryBudgetExceeded
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Exercise the list and detail endpoints on seeded data and fail if any goes over its query budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Requests to seed per status')
+        parser.add_argument('--items', type=int, default=3, help='Items to seed per request')
+
+    def handle(self, *args, **options):
+        failures = []
+
+        # Seed inside a transaction that is rolled back, and force strict budgets
+        with transaction.atomic(), override_settings(QUERY_BUDGET_STRICT=True):
+            users = {
+                role: User.objects.create_user(username=f'budget_{role}', role=role, first_name=role)
+                for role in ['staff', 'approver_1', 'approver_2', 'finance']
+            }
+            ids = self.seed(users, options['requests'], options['items'])
+
+            endpoints = [
+                ('staff', '/api/requests/'),
+                ('staff', f"/api/requests/{ids['pending']}/"),
+                ('approver_1', '/api/requests/'),
+                ('approver_1', '/api/approvals/pending/'),
+                ('approver_2', '/api/approvals/pending/'),
+                ('approver_2', f"/api/requests/{ids['pending']}/"),
+                ('finance', '/api/requests/'),
+                ('finance', f"/api/requests/{ids['approved']}/"),
+                # FinanceViewSet is registered at the root of /api/
+                ('finance', f"/api/{ids['approved']}/"),
+                ('finance', '/api/approved_requests/'),
+                ('finance', '/api/purchase_orders/'),
+            ]
+
+            for role, url in endpoints:
+                client = Client(
+                    HTTP_HOST='localhost',
+                    HTTP_AUTHORIZATION=f'Bearer {UserAccessToken.for_user(users[role])}'
+                )
+                try:
+                    response = client.get(url)
+                    outcome = str(response.status_code)
+                except QueryBudgetExceeded as e:
+                    outcome = f'OVER BUDGET: {e}'
+                    failures.append(url)
+                self.stdout.write(f'{role:>12} {url:<40} {outcome}')
+
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f'{len(failures)} endpoint(s) exceeded their query budget')
+        self.stdout.write(self.style.SUCCESS('All endpoints within their query budget'))
+
+    def seed(self, users, count, items):
+        requests = PurchaseRequest.objects.bulk_create([
+            PurchaseRequest(
+                title=f'Budget request {i}',
+                description='Seeded by check_query_budgets',
+                amount=Decimal('100.00'),
+                status=status,
+                current_level=2,
+                created_by=users['staff'],
+                purchase_order_file='purchase_orders/budget.pdf' if status == 'approved' else None
+            )
+            for status in ['pending', 'approved']
+            for i in range(count)
+        ])
+        RequestItem.objects.bulk_create([
+            RequestItem(purchase_request=r, item_name=f'Item {i}', price=Decimal('10.00'), quantity=1)
+            for r in requests
+            for i in range(items)
+        ])
+        Approval.objects.bulk_create([
+            Approval(purchase_request=r, approver=users['approver_1'], level=1, status='approved')
+            for r in requests
+        ] + [
+            Approval(purchase_request=r, approver=users['approver_2'], level=2, status='approved')
+            for r in requests if r.status == 'approved'
+        ])
+        ApprovedBy = PurchaseRequest.approved_by.through
+        ApprovedBy.objects.bulk_create([
+            ApprovedBy(purchaserequest_id=r.id, user_id=users[role].id)
+            for r in requests if r.status == 'approved'
+            for role in ['approver_1', 'approver_2']
+        ])
+        return {
+            'pending': requests[0].id,
+            'approved': requests[-1].id,
+        }
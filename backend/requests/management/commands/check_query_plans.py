@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from requests.query_plans import hot_queries, query_plan, unindexed_steps
+
+
+class Command(BaseCommand):
+    help = 'Fail if a hot query needs a full table scan or a temp B-tree sort (SQLite EXPLAIN QUERY PLAN)'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write(f'Skipping: query plans are only checked on SQLite, not {connection.vendor}')
+            return
+
+        failures = []
+        for name, queryset in hot_queries():
+            plan = query_plan(queryset)
+            problems = unindexed_steps(plan)
+            if problems:
+                failures.append(name)
+            status = self.style.ERROR('FAIL') if problems else self.style.SUCCESS('ok')
+            self.stdout.write(f'{status} {name}')
+            for step in plan:
+                self.stdout.write(f'      {step}')
+
+        if failures:
+            raise CommandError(f"Unindexed plans for: {', '.join(failures)}")
@@ -0,0 +1,162 @@
+import csv
+import json
+import time
+from decimal import Decimal
+from itertools import groupby
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from requests import bulk
+from requests.models import PurchaseRequest, RequestItem
+
+User = get_user_model()
+
+# Validated per row like Model.clean_fields would
+REQUEST_FIELDS = {name: PurchaseRequest._meta.get_field(name) for name in ('title', 'amount')}
+ITEM_FIELDS = {name: RequestItem._meta.get_field(name) for name in ('item_name', 'price', 'quantity')}
+
+
+class RowError(Exception):
+    pass
+
+
+def clean_fields(fields, values, prefix=''):
+    """Model field validation (max_length, max_digits, ...) as in Model.clean_fields, minus the instance"""
+    cleaned, errors = {}, []
+    for name, field in fields.items():
+        try:
+            cleaned[name] = field.clean(values.get(name), None)
+        except ValidationError as exc:
+            errors.extend(f'{prefix}{name}: {message}' for message in exc.messages)
+    return cleaned, errors
+
+
+class Command(BaseCommand):
+    help = 'Stream purchase requests from a CSV or JSONL file into the database in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--user', help='Username or email to own rows without a created_by column')
+        parser.add_argument('--batch-size', type=int, default=bulk.BATCH_SIZE, help='Requests per INSERT batch')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist')
+        file_format = options['format'] or ('jsonl' if path.suffix in ('.jsonl', '.ndjson') else 'csv')
+
+        self.users = {}
+        try:
+            self.default_user = self.resolve_user(options['user']) if options['user'] else None
+        except RowError as exc:
+            raise CommandError(str(exc))
+
+        with path.open(newline='', encoding='utf-8') as source:
+            records = self.read_csv(source) if file_format == 'csv' else self.read_jsonl(source)
+            rows = (self.normalize(line, record) for line, record in records)
+
+            imported = 0
+            started = last_report = time.perf_counter()
+            try:
+                for chunk in bulk.create_requests(rows, options['batch_size']):
+                    imported += len(chunk)
+                    now = time.perf_counter()
+                    if now - last_report >= 1:
+                        self.stdout.write(f'{imported} requests, {imported / (now - started):.0f} rows/s')
+                        last_report = now
+            except RowError as exc:
+                raise CommandError(f'{exc} ({imported} requests imported before the error)')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} requests in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):.0f} rows/s)'
+        ))
+
+    def read_csv(self, source):
+        """One row per item, consecutive rows sharing a ``ref`` are one request.
+
+        Columns: ref, title, description, amount, created_by, item_name, price,
+        quantity. Without a ``ref`` column every row is its own request.
+        """
+        reader = csv.DictReader(source)
+        numbered = ((reader.line_num, row) for row in reader)
+        if 'ref' not in (reader.fieldnames or []):
+            for line, row in numbered:
+                yield line, self.csv_request(row, [row])
+            return
+
+        for _, group in groupby(numbered, key=lambda pair: pair[1]['ref']):
+            group = list(group)
+            line, first = group[0]
+            yield line, self.csv_request(first, [row for _, row in group])
+
+    def csv_request(self, first, rows):
+        return {
+            'title': first.get('title'),
+            'description': first.get('description', ''),
+            'amount': first.get('amount'),
+            'created_by': first.get('created_by'),
+            'items': [
+                {'item_name': row['item_name'], 'price': row.get('price'), 'quantity': row.get('quantity') or 1}
+                for row in rows if row.get('item_name')
+            ],
+        }
+
+    def read_jsonl(self, source):
+        """One request per line, with the same keys as the bulk-create endpoint plus created_by"""
+        for line, text in enumerate(source, start=1):
+            if not text.strip():
+                continue
+            try:
+                yield line, json.loads(text)
+            except json.JSONDecodeError as exc:
+                raise RowError(f'line {line}: invalid JSON ({exc.msg})')
+
+    def normalize(self, line, record):
+        """Validate a record against the model fields before it joins a batch"""
+        if not isinstance(record, dict):
+            raise RowError(f'line {line}: expected an object')
+
+        items, errors = [], []
+        raw_items = record.get('items') or []
+        if not isinstance(raw_items, list):
+            raw_items, errors = [], ['items: expected a list']
+        for index, item in enumerate(raw_items):
+            if not isinstance(item, dict):
+                errors.append(f'items[{index}]: expected an object')
+                continue
+            cleaned, item_errors = clean_fields(ITEM_FIELDS, dict(item, quantity=item.get('quantity') or 1), f'items[{index}].')
+            items.append(cleaned)
+            errors.extend(item_errors)
+
+        values = {'title': record.get('title'), 'amount': record.get('amount')}
+        if values['amount'] in (None, '') and not errors:
+            # Fall back to the item total when the file has no amount
+            values['amount'] = sum((item['price'] * item['quantity'] for item in items), Decimal('0'))
+        cleaned, request_errors = clean_fields(REQUEST_FIELDS, values)
+        errors = request_errors + errors
+        if errors:
+            raise RowError(f"line {line}: {'; '.join(errors)}")
+
+        owner = record.get('created_by')
+        user = self.resolve_user(owner) if owner else self.default_user
+        if user is None:
+            raise RowError(f'line {line}: no created_by and no --user given')
+
+        return dict(
+            cleaned,
+            description=record.get('description') or '',
+            created_by_id=user.id,
+            items=items,
+        )
+
+    def resolve_user(self, identifier):
+        if identifier not in self.users:
+            user = User.objects.get_by_login(identifier)
+            if user is None:
+                raise RowError(f'unknown user {identifier!r}')
+            self.users[identifier] = user
+        return self.users[identifier]
@@ -0,0 +1,140 @@
+import queue
+import random
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from documents.models import DocumentJob
+from requests.models import PurchaseRequest, Approval, ApprovalConflict
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Race several approvers per level on the same requests and check no approval is lost or duplicated'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests to race on')
+        parser.add_argument('--approvers', type=int, default=4, help='Competing approvers per level')
+        parser.add_argument('--threads', type=int, default=8, help='Worker threads')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        count = options['requests']
+
+        # Workers use their own connections, so the data has to be committed
+        User.objects.filter(username__startswith='stress_').delete()
+        staff = User.objects.create_user(username='stress_staff', role='staff')
+        approvers = {
+            level: [
+                User.objects.create_user(username=f'stress_approver{level}_{i}', role=f'approver_{level}')
+                for i in range(options['approvers'])
+            ]
+            for level in (1, 2)
+        }
+        ids = [
+            r.id for r in PurchaseRequest.objects.bulk_create([
+                PurchaseRequest(
+                    title=f'Stress request {i}',
+                    description='Seeded by stress_approvals',
+                    amount=Decimal('10.00'),
+                    created_by=staff
+                )
+                for i in range(count)
+            ])
+        ]
+
+        try:
+            outcomes = Counter()
+            started = time.perf_counter()
+            for level in (1, 2):
+                # Every approver of the level tries every request, level 2 mixes in rejections
+                tasks = [
+                    (request_id, user, 'reject' if level == 2 and rng.random() < 0.25 else 'approve')
+                    for request_id in ids
+                    for user in approvers[level]
+                ]
+                rng.shuffle(tasks)
+                level_outcomes = self.race(tasks, options['threads'])
+                self.stdout.write(f'level {level}: ' + ', '.join(f'{k}={v}' for k, v in sorted(level_outcomes.items())))
+                outcomes.update(level_outcomes)
+            elapsed = time.perf_counter() - started
+
+            attempts = sum(outcomes.values())
+            self.stdout.write(f'{attempts} decisions in {elapsed:.2f}s ({attempts / elapsed:.0f}/s)')
+            self.verify(ids, outcomes)
+        finally:
+            User.objects.filter(username__startswith='stress_').delete()
+
+        self.stdout.write(self.style.SUCCESS('No lost or duplicate approvals'))
+
+    def race(self, tasks, threads):
+        work = queue.Queue()
+        for task in tasks:
+            work.put(task)
+        outcomes = Counter()
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                while True:
+                    try:
+                        request_id, user, decision = work.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        purchase_request = PurchaseRequest.objects.get(pk=request_id)
+                        getattr(purchase_request, decision)(user, 'stress')
+                        outcome = decision
+                    except ApprovalConflict:
+                        outcome = 'conflict'
+                    except Exception as exc:
+                        outcome = f'error:{exc.__class__.__name__}'
+                    with lock:
+                        outcomes[outcome] += 1
+            finally:
+                connection.close()
+
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        return outcomes
+
+    def verify(self, ids, outcomes):
+        problems = [f'{v} {k}' for k, v in outcomes.items() if k.startswith('error')]
+
+        approvals = Approval.objects.filter(purchase_request_id__in=ids)
+        decided = outcomes['approve'] + outcomes['reject']
+        if approvals.count() != decided:
+            problems.append(f'{decided} successful decisions but {approvals.count()} Approval rows')
+
+        duplicated = approvals.values('purchase_request_id', 'level').annotate(n=Count('id')).filter(n__gt=1)
+        if duplicated.exists():
+            problems.append(f'{duplicated.count()} duplicate approvals')
+
+        requests = PurchaseRequest.objects.filter(id__in=ids)
+        undecided = requests.filter(status='pending').count()
+        if undecided:
+            problems.append(f'{undecided} requests still pending')
+        approved = requests.filter(status='approved').count()
+        if approved != approvals.filter(level=2, status='approved').count():
+            problems.append('request status disagrees with level 2 approvals')
+        if requests.exclude(current_level=2).exists():
+            problems.append('current_level was not advanced on every request')
+        if requests.with_stale_approval_state().exists():
+            problems.append('current_level disagrees with the approvals table')
+
+        jobs = DocumentJob.objects.filter(kind='render_po', purchase_request_id__in=ids).count()
+        if jobs != approved:
+            problems.append(f'{approved} approved requests but {jobs} PO jobs queued')
+
+        if problems:
+            raise CommandError('; '.join(problems))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from requests.models import PurchaseRequest, Approval
+
+
+class Command(BaseCommand):
+    help = 'Backfill PurchaseRequest.current_level from the Approval rows and verify it is in sync'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only verify, exit with an error if any request is out of sync'
+        )
+
+    def handle(self, *args, **options):
+        stale = PurchaseRequest.objects.with_stale_approval_state()
+        count = stale.count()
+
+        if options['check']:
+            if count:
+                sample = ', '.join(str(pk) for pk in stale.order_by('id').values_list('id', flat=True)[:20])
+                raise CommandError(f'{count} request(s) have a stale current_level (e.g. {sample})')
+            self.stdout.write(self.style.SUCCESS('current_level is in sync for every request'))
+            return
+
+        if not count:
+            self.stdout.write(self.style.SUCCESS('Nothing to backfill, current_level is in sync'))
+            return
+
+        level_1_approved = Exists(Approval.objects.filter(
+            purchase_request=OuterRef('pk'), level=1, status='approved'
+        ))
+        with transaction.atomic():
+            promoted = PurchaseRequest.objects.filter(level_1_approved).exclude(current_level=2).update(current_level=2)
+            reset = PurchaseRequest.objects.filter(~level_1_approved).exclude(current_level=1).update(current_level=1)
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {promoted + reset} request(s): {promoted} at level 2, {reset} at level 1'))
@@ -0,0 +1,33 @@
+# Generated by Django 5.1 on 2026-10-18 03:02
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def backfill_current_level(apps, schema_editor):
+    PurchaseRequest = apps.get_model('requests', 'PurchaseRequest')
+    Approval = apps.get_model('requests', 'Approval')
+    level_1_approved = Approval.objects.filter(purchase_request=OuterRef('pk'), level=1, status='approved')
+    PurchaseRequest.objects.filter(Exists(level_1_approved)).update(current_level=2)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requests', '0003_access_pattern_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaserequest',
+            name='current_level',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Approval level that has to act next while the request is pending'),
+        ),
+        migrations.RunPython(backfill_current_level, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='purchaserequest',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['current_level', '-created_at', '-id'], name='pr_pending_level_idx'),
+        ),
+    ]
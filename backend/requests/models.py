@@ -1,7 +1,87 @@
 from django.db import models
 from django.conf import settings
-from django.core.exceptions import ValidationError
-from django.db import transaction
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Prefetch, Q
+from django.utils import timezone
+from backend.metrics import APPROVAL_TRANSITIONS
+
+
+class ApprovalConflict(Exception):
+    """The request moved on (approved, rejected or another level) before this decision landed"""
+
+
+class PurchaseRequestQuerySet(models.QuerySet):
+    def with_list_relations(self):
+        """Load everything PurchaseRequestSerializer touches in a fixed number of queries"""
+        return self.select_related('created_by').prefetch_related('items', 'approved_by')
+
+    def with_detail_relations(self):
+        """Same as with_list_relations plus the approvals shown on the detail page"""
+        return self.with_list_relations().prefetch_related(
+            Prefetch('approvals', queryset=Approval.objects.select_related('approver'))
+        )
+
+    def awaiting_approval_by(self, user):
+        """Pending requests the given approver can act on, read off current_level"""
+        level = PurchaseRequest.APPROVER_LEVELS.get(user.role)
+        if level is None:
+            return self.none()
+        return self.filter(status='pending', current_level=level)
+
+    def decide(self, user, ids, decision, comments=''):
+        """Approve or reject every request in ``ids`` the user can act on.
+
+        Eligibility for the whole set is one query, the state change one UPDATE
+        and the Approval rows one bulk insert. Returns the ids that were decided,
+        the rest were not awaiting this user's level.
+        """
+        level = PurchaseRequest.APPROVER_LEVELS[user.role]
+        if decision == 'reject':
+            changes = {'status': 'rejected'}
+        elif level == 2:
+            changes = {'status': 'approved'}
+        else:
+            changes = {'current_level': level + 1}
+        changes['updated_at'] = timezone.now()
+
+        with transaction.atomic():
+            awaiting = self.filter(pk__in=ids, status='pending', current_level=level)
+            decided = list(awaiting.select_for_update().values_list('pk', flat=True))
+            if not decided:
+                return []
+
+            moved = awaiting.filter(pk__in=decided).update(**changes)
+            if moved != len(decided):
+                raise ApprovalConflict('Some requests were decided concurrently, nothing was changed')
+
+            status = 'approved' if decision == 'approve' else 'rejected'
+            Approval.objects.bulk_create([
+                Approval(
+                    purchase_request_id=request_id,
+                    approver=user,
+                    level=level,
+                    status=status,
+                    comments=comments
+                )
+                for request_id in decided
+            ])
+            transaction.on_commit(lambda: APPROVAL_TRANSITIONS.inc(len(decided), level=level, decision=status))
+
+            if changes.get('status') == 'approved':
+                from documents import jobs
+                transaction.on_commit(lambda: jobs.enqueue_purchase_orders(decided))
+        return decided
+
+    def with_stale_approval_state(self):
+        """Requests whose current_level disagrees with their Approval rows"""
+        level_1_approved = Exists(Approval.objects.filter(
+            purchase_request=OuterRef('pk'), level=1, status='approved'
+        ))
+        return self.filter(
+            (Q(level_1_approved) & ~Q(current_level=2)) |
+            (~Q(level_1_approved) & ~Q(current_level=1))
+        )
 
 
 class PurchaseRequest(models.Model):
@@ -10,6 +90,7 @@ class PurchaseRequest(models.Model):
         ('approved', 'Approved'),
         ('rejected', 'Rejected'),
     ]
+    APPROVER_LEVELS = {'approver_1': 1, 'approver_2': 2}
 
     title = models.CharField(max_length=200)
     description = models.TextField()
@@ -44,67 +125,106 @@ class PurchaseRequest(models.Model):
         blank=True,
         null=True
     )
+    proforma_data = models.JSONField(
+        blank=True,
+        null=True,
+        encoder=DjangoJSONEncoder,
+        help_text="Vendor and items extracted from the proforma"
+    )
+    current_level = models.PositiveSmallIntegerField(
+        default=1,
+        help_text="Approval level that has to act next while the request is pending"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PurchaseRequestQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        # Every list filters on status or created_by and pages newest first on (created_at, id)
+        indexes = [
+            models.Index(fields=['created_by', '-created_at', '-id'], name='pr_owner_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='pr_status_created_idx'),
+            # Approver inboxes only ever read pending rows at their own level
+            models.Index(
+                fields=['current_level', '-created_at', '-id'],
+                name='pr_pending_level_idx',
+                condition=Q(status='pending')
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.status}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so signals can detect transitions
+        instance._loaded_status = dict(zip(field_names, values)).get('status')
+        return instance
+
     def can_edit(self):
         """Check if request can be edited (only pending status)"""
         return self.status == 'pending'
 
     def can_approve(self, user):
         """Check if user can approve this request"""
-        if self.status != 'pending':
-            return False
-
-        approvals = self.approvals.all()
-        approved_levels = set(approval.level for approval in approvals.filter(status='approved'))
-
-        if user.role == 'approver_1' and 1 not in approved_levels:
-            return True
-        elif user.role == 'approver_2' and 1 in approved_levels and 2 not in approved_levels:
-            return True
-
-        return False
+        return self.status == 'pending' and self.current_level == self.APPROVER_LEVELS.get(user.role)
 
     def approve(self, user, comments=''):
         """Approve the request"""
-        with transaction.atomic():
-            level = 1 if user.role == 'approver_1' else 2
-            Approval.objects.create(
-                purchase_request=self,
-                approver=user,
-                level=level,
-                status='approved',
-                comments=comments
-            )
-
-            # Check if fully approved
-            approvals = self.approvals.all()
-            if approvals.filter(level=1, status='approved').exists() and \
-               approvals.filter(level=2, status='approved').exists():
-                self.status = 'approved'
-                self.save()
-                # TODO: Generate PO
+        level = self.APPROVER_LEVELS[user.role]
+        # Level 2 is the last one, anything below hands over to the next level
+        if level == 2:
+            changes = {'status': 'approved'}
+        else:
+            changes = {'current_level': level + 1}
+        self._decide(user, level, 'approved', comments, changes)
 
     def reject(self, user, comments=''):
         """Reject the request"""
+        level = self.APPROVER_LEVELS[user.role]
+        self._decide(user, level, 'rejected', comments, {'status': 'rejected'})
+
+    def _decide(self, user, level, decision, comments, changes):
+        """Move the request on only if it is still pending at ``level``.
+
+        The guarded UPDATE is the first write of the transaction, so concurrent
+        decisions on the same request serialize on it and every loser sees zero
+        rows instead of racing into the Approval unique constraint.
+        """
+        changes['updated_at'] = timezone.now()
+
         with transaction.atomic():
-            level = 1 if user.role == 'approver_1' else 2
-            Approval.objects.create(
-                purchase_request=self,
-                approver=user,
-                level=level,
-                status='rejected',
-                comments=comments
-            )
-            self.status = 'rejected'
-            self.save()
+            moved = PurchaseRequest.objects.filter(
+                pk=self.pk, status='pending', current_level=level
+            ).update(**changes)
+            if not moved:
+                raise ApprovalConflict(f'Request {self.pk} is no longer awaiting level {level} approval')
+
+            try:
+                Approval.objects.create(
+                    purchase_request=self,
+                    approver=user,
+                    level=level,
+                    status=decision,
+                    comments=comments
+                )
+            except IntegrityError:
+                # current_level was out of sync with the approvals table
+                raise ApprovalConflict(f'Request {self.pk} already has a level {level} decision') from None
+
+            for field, value in changes.items():
+                setattr(self, field, value)
+            transaction.on_commit(lambda: APPROVAL_TRANSITIONS.inc(level=level, decision=decision))
+
+            # update() bypasses post_save, so queue the PO here
+            if self.status == 'approved':
+                from documents import jobs
+                request_id = self.pk
+                transaction.on_commit(lambda: jobs.enqueue_purchase_order(request_id))
+            self._loaded_status = self.status
 
 
 class Approval(models.Model):
@@ -0,0 +1,74 @@
+import functools
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in strict mode when a view issues more queries than it is allowed"""
+
+
+class QueryCounter:
+    """Count the SQL queries executed on the default connection while active"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+
+def check_budget(name, used, budget):
+    """Report a view that went over its query budget"""
+    if budget is None or used <= budget:
+        return
+    message = f'{name} issued {used} queries, budget is {budget}'
+    if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class QueryBudgetMixin:
+    """Enforce a fixed number of queries per viewset action
+
+    Budgets count every query of the request, including the auth state lookup
+    ClaimsJWTAuthentication makes when its per-process cache has no fresh
+    entry for the user, so they can be compared directly against the SQL log.
+    """
+    query_budgets = {}
+
+    def dispatch(self, request, *args, **kwargs):
+        with QueryCounter() as counter:
+            response = super().dispatch(request, *args, **kwargs)
+        action = getattr(self, 'action', None)
+        check_budget(
+            f'{self.__class__.__name__}.{action}',
+            counter.count,
+            self.query_budgets.get(action)
+        )
+        return response
+
+
+def query_budget(budget):
+    """Function view equivalent of QueryBudgetMixin"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            with QueryCounter() as counter:
+                response = view(request, *args, **kwargs)
+            check_budget(view.__name__, counter.count, budget)
+            return response
+        return wrapped
+    return decorator
@@ -0,0 +1,55 @@
+"""The hot list, inbox and login queries, and what SQLite plans for them.
+
+Each of these runs on nearly every page view, so none may scan a table or
+sort into a temp B-tree. requests.tests enforces that; ``manage.py
+check_query_plans`` prints the plans for a database with real data.
+"""
+from types import SimpleNamespace
+
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from accounts.models import User
+from .models import PurchaseRequest, Approval
+
+
+def hot_queries():
+    """The queries behind get_queryset, pending_approvals, the finance actions and login"""
+    ordering = ('-created_at', '-id')
+    now = timezone.now()
+    after_cursor = Q(created_at__lt=now) | Q(created_at=now, id__lt=1000)
+
+    return [
+        ('staff list', PurchaseRequest.objects.filter(created_by_id=1).order_by(*ordering)[:21]),
+        ('staff list, next page', PurchaseRequest.objects.filter(after_cursor, created_by_id=1).order_by(*ordering)[:21]),
+        ('approver list', PurchaseRequest.objects.filter(status='pending').order_by(*ordering)[:21]),
+        ('finance approved requests', PurchaseRequest.objects.filter(status='approved').order_by(*ordering)[:21]),
+        ('finance approved requests, next page',
+         PurchaseRequest.objects.filter(after_cursor, status='approved').order_by(*ordering)[:21]),
+        ('finance purchase orders',
+         PurchaseRequest.objects.filter(status='approved').exclude(purchase_order_file='').order_by(*ordering)[:21]),
+        ('approver_1 inbox',
+         PurchaseRequest.objects.awaiting_approval_by(SimpleNamespace(role='approver_1')).order_by(*ordering)[:21]),
+        ('approver_2 inbox, next page',
+         PurchaseRequest.objects.awaiting_approval_by(SimpleNamespace(role='approver_2'))
+         .filter(after_cursor).order_by(*ordering)[:21]),
+        ('approval probe',
+         Approval.objects.filter(purchase_request_id=1, level=1, status='approved').order_by()[:1]),
+        ('login by username or email', User.objects.by_login('someone@example.com')[:2]),
+    ]
+
+
+def query_plan(queryset):
+    """SQLite's EXPLAIN QUERY PLAN steps for the queryset"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def unindexed_steps(plan):
+    """Full table scans and temp B-tree sorts in a plan"""
+    return [
+        step for step in plan
+        if 'TEMP B-TREE' in step or (step.startswith('SCAN') and 'INDEX' not in step)
+    ]
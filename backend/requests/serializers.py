@@ -30,10 +30,13 @@ class PurchaseRequestSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'description', 'amount', 'status',
             'created_by', 'created_by_name', 'approved_by', 'approved_by_names',
-            'proforma_file', 'receipt_file', 'purchase_order_file',
-            'created_at', 'updated_at', 'items'
+            'proforma_file', 'proforma_data', 'receipt_file', 'purchase_order_file',
+            'current_level', 'created_at', 'updated_at', 'items'
+        ]
+        read_only_fields = [
+            'id', 'created_at', 'updated_at', 'approved_by', 'approved_by_names',
+            'proforma_data', 'current_level'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at', 'approved_by', 'approved_by_names']
 
     def get_approved_by_names(self, obj):
         return [user.get_full_name() for user in obj.approved_by.all()]
@@ -57,11 +60,20 @@ class PurchaseRequestCreateSerializer(serializers.ModelSerializer):
         items_data = validated_data.pop('items', [])
         validated_data['created_by'] = self.context['request'].user
         request = PurchaseRequest.objects.create(**validated_data)
+        RequestItem.objects.bulk_create([
+            RequestItem(purchase_request=request, **item_data)
+            for item_data in items_data
+        ])
+        return request
 
-        for item_data in items_data:
-            RequestItem.objects.create(purchase_request=request, **item_data)
 
-        return request
+class BulkPurchaseRequestSerializer(serializers.ModelSerializer):
+    """One entry of a bulk-create payload, no file uploads"""
+    items = RequestItemSerializer(many=True, required=False)
+
+    class Meta:
+        model = PurchaseRequest
+        fields = ['title', 'description', 'amount', 'items']
 
 
 class ApprovalActionSerializer(serializers.Serializer):
@@ -69,5 +81,20 @@ class ApprovalActionSerializer(serializers.Serializer):
     comments = serializers.CharField(required=False, allow_blank=True)
 
 
+class BulkApprovalActionSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=500
+    )
+    comments = serializers.CharField(required=False, allow_blank=True)
+
+
 class FileUploadSerializer(serializers.Serializer):
-    file = serializers.FileField()
\ No newline at end of file
+    file = serializers.FileField()
+
+
+class UploadStartSerializer(serializers.Serializer):
+    document = serializers.ChoiceField(choices=['proforma', 'receipt'])
+    filename = serializers.CharField(max_length=200)
+    size = serializers.IntegerField(min_value=1)
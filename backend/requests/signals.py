@@ -1,15 +1,30 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from .models import PurchaseRequest
-from documents.services import po_generator
+from documents import jobs
 
 
 @receiver(post_save, sender=PurchaseRequest)
 def generate_purchase_order(sender, instance, created, **kwargs):
-    """Generate PO when request is approved"""
-    if instance.status == 'approved' and not instance.purchase_order_file:
-        # Generate PO
-        po_file = po_generator.generate_po(instance)
-        if po_file:
-            instance.purchase_order_file = po_file
-            instance.save(update_fields=['purchase_order_file'])
\ No newline at end of file
+    """Queue PO rendering when a request transitions to approved"""
+    previous_status = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+
+    if instance.status != 'approved' or instance.purchase_order_file:
+        return
+    if not created and previous_status == 'approved':
+        return
+
+    # Render in the document worker once the approval is committed
+    request_id = instance.id
+    transaction.on_commit(lambda: jobs.enqueue_purchase_order(request_id))
+
+
+@receiver(post_delete, sender=PurchaseRequest)
+def release_files(sender, instance, **kwargs):
+    """Drop the deleted request's file references once the delete is committed"""
+    for field_file in [instance.proforma_file, instance.receipt_file, instance.purchase_order_file]:
+        if field_file:
+            storage, name = field_file.storage, field_file.name
+            transaction.on_commit(lambda storage=storage, name=name: storage.delete(name))
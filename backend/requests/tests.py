@@ -0,0 +1,367 @@
+import tempfile
+import threading
+from collections import Counter
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from accounts.authentication import forget_user
+from accounts.tokens import UserAccessToken
+from documents.models import Blob
+from documents.storage import blob_key
+from .models import Approval, ApprovalConflict, PurchaseRequest, RequestItem
+from .query_plans import hot_queries, query_plan, unindexed_steps
+from .views import PurchaseRequestViewSet
+
+
+def create_user(username, role):
+    # No password: clients authenticate with tokens, and hashing one per user is slow
+    return get_user_model().objects.create_user(username=username, email=f'{username}@example.com', role=role)
+
+
+def client_for(user):
+    # Not DRF's APIClient: rest_framework.test imports the requests package this app shadows
+    return Client(HTTP_AUTHORIZATION=f'Bearer {UserAccessToken.for_user(user)}')
+
+
+def create_request(user, **fields):
+    fields.setdefault('title', 'Office chairs')
+    fields.setdefault('description', 'Four chairs')
+    fields.setdefault('amount', '480.00')
+    return PurchaseRequest.objects.create(created_by=user, **fields)
+
+
+class ReceiptUploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.finance = create_user('finance', 'finance')
+        self.purchase_request = create_request(create_user('staff', 'staff'), status='approved')
+        self.client = client_for(self.finance)
+
+    def upload(self, content):
+        return self.client.post(
+            f'/api/requests/{self.purchase_request.id}/upload_receipt/',
+            {'file': SimpleUploadedFile('receipt.pdf', content, content_type='application/pdf')}
+        )
+
+    def test_upload_keeps_purchase_order_attached_meanwhile(self):
+        get_object = PurchaseRequestViewSet.get_object
+
+        def load_then_attach_po(view):
+            obj = get_object(view)
+            # The document worker attaches the rendered PO after the view loaded the request
+            PurchaseRequest.objects.filter(id=obj.id).update(purchase_order_file='purchase_orders/po.pdf')
+            return obj
+
+        with mock.patch.object(PurchaseRequestViewSet, 'get_object', load_then_attach_po):
+            response = self.upload(b'%PDF-receipt')
+
+        self.assertEqual(response.status_code, 200)
+        self.purchase_request.refresh_from_db()
+        self.assertEqual(self.purchase_request.purchase_order_file.name, 'purchase_orders/po.pdf')
+        self.assertTrue(self.purchase_request.receipt_file)
+
+    def test_replaced_receipt_is_released_after_commit(self):
+        self.upload(b'%PDF-first receipt')
+        self.purchase_request.refresh_from_db()
+        first = Blob.objects.get(key=blob_key(self.purchase_request.receipt_file.name))
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.upload(b'%PDF-second receipt')
+            first.refresh_from_db()
+            self.assertEqual(first.refcount, 1)
+
+        self.assertEqual(len(callbacks), 1)
+        first.refresh_from_db()
+        self.assertEqual(first.refcount, 0)
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        staff = create_user('staff', 'staff')
+        self.purchase_request = create_request(staff)
+        self.client = client_for(staff)
+        self.content = b'%PDF-1.7 proforma body'
+        response = self.client.post(
+            f'/api/requests/{self.purchase_request.pk}/uploads/',
+            {'document': 'proforma', 'filename': 'quote.pdf', 'size': len(self.content)}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.url = f"/api/requests/{self.purchase_request.pk}/uploads/{response.json()['upload_id']}/"
+
+    def put(self, offset, data, **extra):
+        return self.client.put(self.url, data, content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset), **extra)
+
+    def test_resume_inside_the_file_signature(self):
+        self.assertEqual(self.put(0, self.content[:3]).status_code, 200)
+        response = self.put(3, self.content[3:])
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response['Upload-Offset'], str(len(self.content)))
+
+        self.assertEqual(self.client.post(f'{self.url}finalize/').status_code, 202)
+        self.purchase_request.refresh_from_db()
+        with self.purchase_request.proforma_file.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_wrong_signature_after_resume_is_rejected(self):
+        self.put(0, self.content[:3])
+        self.assertEqual(self.put(3, b'XYZ').status_code, 415)
+
+    def test_invalid_content_length(self):
+        self.assertEqual(self.put(0, self.content, CONTENT_LENGTH='lots').status_code, 400)
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN output is SQLite specific')
+        for name, queryset in hot_queries():
+            with self.subTest(name):
+                plan = query_plan(queryset)
+                self.assertEqual(unindexed_steps(plan), [], '\n'.join(plan))
+
+
+class ConcurrentApprovalTests(TransactionTestCase):
+    """Approvers of the same level deciding at once, each on its own connection"""
+    approvers = 4
+
+    def setUp(self):
+        self.staff = create_user('staff', 'staff')
+        self.level_1 = [create_user(f'approver1_{i}', 'approver_1') for i in range(self.approvers)]
+        self.level_2 = [create_user(f'approver2_{i}', 'approver_2') for i in range(self.approvers)]
+
+    def race(self, users, decide):
+        """decide(user, barrier) in one thread per user, returns the outcomes"""
+        barrier = threading.Barrier(len(users), timeout=10)
+        outcomes = []
+
+        def run(user):
+            try:
+                outcomes.append(decide(user, barrier))
+            except Exception as exc:
+                outcomes.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def assert_one_approval_per_level(self, ids, levels):
+        approvals = Approval.objects.filter(purchase_request_id__in=ids)
+        self.assertEqual(approvals.count(), len(ids) * len(levels))
+        per_level = approvals.values('purchase_request_id', 'level').annotate(n=Count('id'))
+        self.assertEqual({row['n'] for row in per_level}, {1})
+
+    def test_one_approver_per_level_wins(self):
+        purchase_request = create_request(self.staff)
+
+        def approve(user, barrier):
+            # Everyone has loaded the request while it still awaits their level
+            loaded = PurchaseRequest.objects.get(pk=purchase_request.pk)
+            barrier.wait()
+            loaded.approve(user)
+            return 'approved'
+
+        for level, users in ((1, self.level_1), (2, self.level_2)):
+            outcomes = self.race(users, approve)
+            self.assertEqual(outcomes.count('approved'), 1, outcomes)
+            conflicts = [outcome for outcome in outcomes if isinstance(outcome, ApprovalConflict)]
+            self.assertEqual(len(conflicts), self.approvers - 1, outcomes)
+
+        purchase_request.refresh_from_db()
+        self.assertEqual(purchase_request.status, 'approved')
+        self.assert_one_approval_per_level([purchase_request.pk], (1, 2))
+
+    def test_losing_approver_gets_409(self):
+        purchase_request = create_request(self.staff)
+        barrier = threading.Barrier(self.approvers, timeout=10)
+        approve = PurchaseRequest.approve
+
+        def approve_together(obj, user, comments=''):
+            # Every request is past the permission checks, which pass while the request is pending
+            barrier.wait()
+            approve(obj, user, comments)
+
+        def post(user, _):
+            return client_for(user).post(f'/api/requests/{purchase_request.pk}/approve/', {'action': 'approve'}).status_code
+
+        with mock.patch.object(PurchaseRequest, 'approve', approve_together):
+            statuses = self.race(self.level_1, post)
+
+        self.assertEqual(Counter(statuses), {200: 1, 409: self.approvers - 1})
+        self.assert_one_approval_per_level([purchase_request.pk], (1,))
+
+    def test_bulk_decisions_decide_each_request_once(self):
+        ids = [create_request(self.staff, title=f'Request {i}').pk for i in range(20)]
+
+        def decide(user, barrier):
+            barrier.wait()
+            return PurchaseRequest.objects.decide(user, ids, 'approve')
+
+        for users in (self.level_1, self.level_2):
+            outcomes = self.race(users, decide)
+            decided = [request_id for outcome in outcomes if isinstance(outcome, list) for request_id in outcome]
+            # Losers either find nothing left to decide or get a conflict for the whole batch
+            self.assertTrue(all(isinstance(outcome, (list, ApprovalConflict)) for outcome in outcomes), outcomes)
+            self.assertEqual(sorted(decided), sorted(ids))
+
+        self.assertEqual(PurchaseRequest.objects.filter(pk__in=ids, status='approved').count(), len(ids))
+        self.assert_one_approval_per_level(ids, (1, 2))
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+
+    def test_endpoints_stay_within_budget(self):
+        # Strict budgets: a view over its budget raises QueryBudgetExceeded and the command fails
+        call_command('check_query_budgets', '--requests', '5', stdout=StringIO())
+
+    def test_budgets_match_a_cold_auth_cache(self):
+        staff = create_user('staff', 'staff')
+        approver = create_user('approver', 'approver_1')
+        purchase_request = create_request(staff)
+        RequestItem.objects.create(purchase_request=purchase_request, item_name='Chair', price='120.00', quantity=4)
+        Approval.objects.create(purchase_request=purchase_request, approver=approver, level=1, status='approved')
+        purchase_request.approved_by.add(approver)
+        purchase_request.proforma_file.save('proforma.pdf', ContentFile(b'%PDF-proforma'))
+        client = client_for(staff)
+
+        budgets = PurchaseRequestViewSet.query_budgets
+        for action, url in [
+            ('list', '/api/requests/'),
+            ('retrieve', f'/api/requests/{purchase_request.pk}/'),
+            ('download', f'/api/requests/{purchase_request.pk}/files/proforma/'),
+        ]:
+            with self.subTest(action):
+                forget_user(staff.pk)
+                with self.assertNumQueries(budgets[action]):
+                    response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+
+class FlatQueryCountTests(TestCase):
+    """List endpoints cost the same number of queries for one request as for a page of them"""
+
+    def setUp(self):
+        self.staff = create_user('staff', 'staff')
+        self.approver_1 = create_user('approver1', 'approver_1')
+        self.approver_2 = create_user('approver2', 'approver_2')
+
+    def add_requests(self, count):
+        # Pending at level 2 with items and a level 1 approval, what the approver dashboard shows
+        for i in range(count):
+            purchase_request = create_request(self.staff, title=f'Request {i}', current_level=2)
+            RequestItem.objects.bulk_create([
+                RequestItem(purchase_request=purchase_request, item_name=f'Item {j}', price='10.00', quantity=1)
+                for j in range(3)
+            ])
+            Approval.objects.create(purchase_request=purchase_request, approver=self.approver_1, level=1, status='approved')
+            purchase_request.approved_by.add(self.approver_1)
+
+    def test_query_count_does_not_grow_with_requests(self):
+        endpoints = [
+            (self.approver_2, '/api/approvals/pending/'),
+            (self.approver_2, '/api/requests/'),
+            (self.approver_1, '/api/requests/'),
+            (self.staff, '/api/requests/'),
+        ]
+        clients = {user: client_for(user) for user, _ in endpoints}
+        for user, client in clients.items():
+            # Warm the auth state cache so only the views' own queries are counted
+            client.get('/api/requests/')
+
+        self.add_requests(1)
+        counts = []
+        for user, url in endpoints:
+            with CaptureQueriesContext(connection) as captured:
+                response = clients[user].get(url)
+            self.assertEqual(len(response.json()['results']), 1)
+            counts.append(len(captured))
+
+        self.add_requests(9)
+        for (user, url), queries in zip(endpoints, counts):
+            with self.subTest(role=user.role, url=url):
+                with self.assertNumQueries(queries):
+                    response = clients[user].get(url)
+                self.assertEqual(len(response.json()['results']), 10)
+
+
+class PendingApprovalsTests(TestCase):
+    def test_inbox_pages_by_cursor(self):
+        staff = create_user('staff', 'staff')
+        approver = create_user('approver', 'approver_1')
+        PurchaseRequest.objects.bulk_create([
+            PurchaseRequest(title=f'Request {i}', description='', amount='10.00', created_by=staff)
+            for i in range(25)
+        ])
+        client = client_for(approver)
+
+        # No COUNT(*): page, items, approved_by and the auth state lookup
+        forget_user(approver.pk)
+        with self.assertNumQueries(4):
+            first = client.get('/api/approvals/pending/').json()
+        self.assertNotIn('count', first)
+        self.assertEqual(len(first['results']), 20)
+
+        second = client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['next'])
+        seen = {row['id'] for row in first['results'] + second['results']}
+        self.assertEqual(len(seen), 25)
+
+
+class ImportRequestsTests(TestCase):
+    def setUp(self):
+        self.staff = create_user('staff', 'staff')
+
+    def import_csv(self, content):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write(content)
+            f.flush()
+            call_command('import_requests', f.name, '--user', 'staff', stdout=StringIO())
+
+    def test_rows_are_validated_against_the_model_fields(self):
+        long_title = 'x' * 201
+        content = (
+            'ref,title,description,amount,item_name,price,quantity\n'
+            'a,Chairs,,100.00,Chair,25.00,4\n'
+            f'b,{long_title},,10.00,,,\n'
+            'c,Servers,,123456789012.00,,,\n'
+        )
+        with self.assertRaisesMessage(CommandError, 'line 3: title: Ensure this value has at most 200 characters'):
+            self.import_csv(content)
+        # Nothing of the batch holding the bad row is written
+        self.assertFalse(PurchaseRequest.objects.exists())
+
+        with self.assertRaisesMessage(CommandError, 'line 4: amount: Ensure that there are no more than 10 digits'):
+            self.import_csv(content.replace(long_title, 'Desks'))
+
+    def test_amount_defaults_to_the_item_total(self):
+        self.import_csv(
+            'ref,title,description,amount,item_name,price,quantity\n'
+            'a,Desks,Two desks,,Desk,150.00,2\n'
+            'a,Desks,Two desks,,Lamp,20.00,\n'
+        )
+        purchase_request = PurchaseRequest.objects.get()
+        self.assertEqual(str(purchase_request.amount), '320.00')
+        self.assertEqual(purchase_request.items.count(), 2)
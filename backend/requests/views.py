@@ -1,24 +1,57 @@
+import os
+
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import PurchaseRequest
+from .models import PurchaseRequest, ApprovalConflict
 from .serializers import (
     PurchaseRequestSerializer, PurchaseRequestDetailSerializer,
     PurchaseRequestCreateSerializer, ApprovalActionSerializer,
-    FileUploadSerializer
+    BulkApprovalActionSerializer, BulkPurchaseRequestSerializer, FileUploadSerializer,
+    UploadStartSerializer
 )
 from .permissions import IsStaff, IsApprover, IsOwnerOrReadOnly, CanApproveRequest
+from .query_budget import QueryBudgetMixin, query_budget
+from .pagination import KeysetPagination
+from . import bulk
 from finance.permissions import IsFinanceUser
-from documents.services import extract
+from documents import chunked, downloads, jobs
+from documents.downloads import AnyMediaJSONRenderer
+from documents.models import UploadSession
+
+# Who may upload each document and in which request status
+UPLOAD_DOCUMENTS = {
+    'proforma': {
+        'permission': IsStaff,
+        'status': 'pending',
+        'status_error': 'Cannot upload to non-pending request',
+    },
+    'receipt': {
+        'permission': IsFinanceUser,
+        'status': 'approved',
+        'status_error': 'Cannot upload receipt to non-approved request',
+    },
+}
 
 
-class PurchaseRequestViewSet(viewsets.ModelViewSet):
+class PurchaseRequestViewSet(QueryBudgetMixin, viewsets.ModelViewSet):
     queryset = PurchaseRequest.objects.all()
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status']
+    pagination_class = KeysetPagination
+    # page, items, approved_by (+ approvals on detail) or the request for downloads,
+    # plus the auth state lookup on a cold cache
+    query_budgets = {
+        'list': 4,
+        'retrieve': 5,
+        'download': 2,
+    }
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -34,57 +67,248 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated(), IsOwnerOrReadOnly()]
         elif self.action == 'destroy':
             return [IsAuthenticated(), IsStaff()]
-        return [IsAuthenticated()]
+        # Custom actions declare their own permission_classes
+        return super().get_permissions()
 
     def get_queryset(self):
         user = self.request.user
         if user.role == 'staff':
-            return PurchaseRequest.objects.filter(created_by=user)
+            queryset = PurchaseRequest.objects.filter(created_by=user)
         elif user.role in ['approver_1', 'approver_2']:
             # Return requests that this approver can act on
-            return PurchaseRequest.objects.filter(status='pending')
+            queryset = PurchaseRequest.objects.filter(status='pending')
         elif user.role == 'finance':
-            return PurchaseRequest.objects.filter(status='approved')
-        return PurchaseRequest.objects.none()
+            queryset = PurchaseRequest.objects.filter(status='approved')
+        else:
+            return PurchaseRequest.objects.none()
+
+        if self.action == 'list':
+            return queryset.with_list_relations()
+        elif self.action == 'retrieve':
+            return queryset.with_detail_relations()
+        return queryset
+
+    def perform_create(self, serializer):
+        obj = serializer.save()
+        if obj.proforma_file:
+            jobs.enqueue_proforma_extraction(obj)
+
+    @action(detail=False, methods=['post'], url_path='bulk-create', permission_classes=[IsAuthenticated, IsStaff])
+    def bulk_create_requests(self, request):
+        serializer = BulkPurchaseRequestSerializer(data=request.data, many=True, allow_empty=False, max_length=1000)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        rows = [dict(row, created_by_id=request.user.id) for row in serializer.validated_data]
+        # All or nothing: chunks commit into the outer transaction
+        with transaction.atomic():
+            created = [obj.id for chunk in bulk.create_requests(rows) for obj in chunk]
+        return Response({'created': len(created), 'ids': created}, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsStaff])
     def upload_proforma(self, request, pk=None):
         obj = self.get_object()
-        if obj.status != 'pending':
-            return Response({'error': 'Cannot upload to non-pending request'}, status=400)
+        if obj.status != UPLOAD_DOCUMENTS['proforma']['status']:
+            return Response({'error': UPLOAD_DOCUMENTS['proforma']['status_error']}, status=400)
 
         serializer = FileUploadSerializer(data=request.data)
         if serializer.is_valid():
-            obj.proforma_file = serializer.validated_data['file']
-            obj.save()
-
-            # Extract data from proforma
-            extracted_data = extract.extract_proforma_data(obj.proforma_file.path)
-            # TODO: Store extracted data
-
-            return Response({'message': 'Proforma uploaded successfully'})
+            return self._attach_proforma(obj, serializer.validated_data['file'])
         return Response(serializer.errors, status=400)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsFinanceUser])
     def upload_receipt(self, request, pk=None):
         obj = self.get_object()
-        if obj.status != 'approved':
-            return Response({'error': 'Cannot upload receipt to non-approved request'}, status=400)
+        if obj.status != UPLOAD_DOCUMENTS['receipt']['status']:
+            return Response({'error': UPLOAD_DOCUMENTS['receipt']['status_error']}, status=400)
 
         serializer = FileUploadSerializer(data=request.data)
         if serializer.is_valid():
-            obj.receipt_file = serializer.validated_data['file']
-            obj.save()
-            return Response({'message': 'Receipt uploaded successfully'})
+            return self._attach_receipt(obj, serializer.validated_data['file'])
         return Response(serializer.errors, status=400)
 
+    def _attach_proforma(self, obj, uploaded):
+        previous = obj.proforma_file.name
+        obj.proforma_file = uploaded
+        obj.proforma_data = None
+        with transaction.atomic():
+            # Only these columns: a PO attached by the document worker since
+            # obj was loaded must not be written back as empty
+            obj.save(update_fields=['proforma_file', 'proforma_data', 'updated_at'])
+            # Extraction runs in the document worker, results land on proforma_data
+            job = jobs.enqueue_proforma_extraction(obj)
+            self._release_after_commit(obj.proforma_file.storage, previous)
+
+        return Response({
+            'message': 'Proforma uploaded successfully',
+            'job_id': job.id
+        }, status=status.HTTP_202_ACCEPTED)
+
+    def _attach_receipt(self, obj, uploaded):
+        previous = obj.receipt_file.name
+        obj.receipt_file = uploaded
+        with transaction.atomic():
+            obj.save(update_fields=['receipt_file', 'updated_at'])
+            self._release_after_commit(obj.receipt_file.storage, previous)
+        return Response({'message': 'Receipt uploaded successfully'})
+
+    @staticmethod
+    def _release_after_commit(storage, previous):
+        # Drops the old file's reference once nothing can roll back to it,
+        # the blob goes once nothing uses it
+        if previous:
+            transaction.on_commit(lambda: storage.delete(previous))
+
+    @action(
+        detail=True,
+        methods=['get'],
+        url_path=r'files/(?P<document>proforma|receipt|purchase_order)',
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[JSONRenderer, AnyMediaJSONRenderer]
+    )
+    def download(self, request, pk=None, document=None):
+        """The request's proforma, receipt or PO, for whoever may see the request"""
+        obj = self.get_object()
+        field_file = getattr(obj, f'{document}_file')
+        if not field_file:
+            return Response({'error': f"No {document.replace('_', ' ')} file"}, status=404)
+        ext = os.path.splitext(field_file.name)[1]
+        return downloads.serve(
+            request,
+            field_file,
+            f'{document}-{obj.id}{ext}',
+            as_attachment=request.query_params.get('download') == '1'
+        )
+
+    @action(detail=True, methods=['post'], url_path='uploads', permission_classes=[IsAuthenticated])
+    def start_upload(self, request, pk=None):
+        """Open a chunked upload of a proforma or receipt, for files too big for one request"""
+        serializer = UploadStartSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        document = serializer.validated_data['document']
+        obj = self._upload_target(request, document)
+        if obj.status != UPLOAD_DOCUMENTS[document]['status']:
+            return Response({'error': UPLOAD_DOCUMENTS[document]['status_error']}, status=400)
+
+        try:
+            session = chunked.start(
+                obj,
+                request.user,
+                document,
+                serializer.validated_data['filename'],
+                serializer.validated_data['size']
+            )
+        except chunked.UploadError as exc:
+            return self._upload_error(exc)
+        return self._upload_state(session, 0, status_code=status.HTTP_201_CREATED)
+
+    @action(
+        detail=True,
+        methods=['get', 'put', 'delete'],
+        url_path=r'uploads/(?P<upload_id>[0-9a-f-]{36})',
+        permission_classes=[IsAuthenticated]
+    )
+    def upload_chunk(self, request, pk=None, upload_id=None):
+        """GET: offset to resume from. PUT: raw bytes at the Upload-Offset header. DELETE: abort"""
+        session = self._upload_session(request, upload_id)
+        if request.method == 'DELETE':
+            chunked.discard(session)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        try:
+            if request.method == 'GET':
+                return self._upload_state(session, chunked.received(session))
+            try:
+                offset = int(request.headers['Upload-Offset'])
+            except (KeyError, ValueError):
+                return Response({'error': 'Upload-Offset header with the chunk\'s byte offset is required'}, status=400)
+            try:
+                length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                return Response({'error': 'Invalid Content-Length header'}, status=400)
+            # The raw body, read in small pieces rather than parsed into request.data
+            offset = chunked.write_chunk(session, offset, request.stream, length)
+        except chunked.UploadError as exc:
+            return self._upload_error(exc)
+        return self._upload_state(session, offset)
+
+    @action(
+        detail=True,
+        methods=['post'],
+        url_path=r'uploads/(?P<upload_id>[0-9a-f-]{36})/finalize',
+        permission_classes=[IsAuthenticated]
+    )
+    def finish_upload(self, request, pk=None, upload_id=None):
+        """Attach a completely received upload, same response as upload_proforma/upload_receipt"""
+        session = self._upload_session(request, upload_id)
+        obj = session.purchase_request
+        if obj.status != UPLOAD_DOCUMENTS[session.document]['status']:
+            chunked.discard(session)
+            return Response({'error': UPLOAD_DOCUMENTS[session.document]['status_error']}, status=400)
+
+        try:
+            uploaded = chunked.finish(session)
+        except chunked.UploadError as exc:
+            return self._upload_error(exc)
+        try:
+            if session.document == 'proforma':
+                return self._attach_proforma(obj, uploaded)
+            return self._attach_receipt(obj, uploaded)
+        finally:
+            uploaded.close()
+            chunked.discard(session)
+
+    def _upload_target(self, request, document):
+        """The request, if the user may upload this kind of document to it"""
+        obj = self.get_object()
+        permission = UPLOAD_DOCUMENTS[document]['permission']()
+        if not (permission.has_permission(request, self) and permission.has_object_permission(request, self, obj)):
+            self.permission_denied(request)
+        return obj
+
+    def _upload_session(self, request, upload_id):
+        obj = self.get_object()
+        session = get_object_or_404(
+            UploadSession.objects.select_related('purchase_request'),
+            id=upload_id,
+            purchase_request=obj,
+            created_by=request.user
+        )
+        self._upload_target(request, session.document)
+        return session
+
+    def _upload_state(self, session, offset, status_code=status.HTTP_200_OK):
+        response = Response({
+            'upload_id': session.id,
+            'document': session.document,
+            'filename': session.filename,
+            'size': session.size,
+            'offset': offset,
+            'chunk_size': settings.DOCUMENT_UPLOAD_CHUNK_SIZE,
+        }, status=status_code)
+        response['Upload-Offset'] = str(offset)
+        return response
+
+    def _upload_error(self, exc):
+        if exc.offset is None:
+            return Response({'error': str(exc)}, status=exc.status)
+        response = Response({'error': str(exc), 'offset': exc.offset}, status=exc.status)
+        response['Upload-Offset'] = str(exc.offset)
+        return response
+
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, CanApproveRequest])
     def approve(self, request, pk=None):
         obj = self.get_object()
         serializer = ApprovalActionSerializer(data=request.data)
         if serializer.is_valid():
             comments = serializer.validated_data.get('comments', '')
-            obj.approve(request.user, comments)
+            try:
+                obj.approve(request.user, comments)
+            except ApprovalConflict as exc:
+                return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
             return Response({'message': 'Request approved'})
         return Response(serializer.errors, status=400)
 
@@ -94,26 +318,50 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
         serializer = ApprovalActionSerializer(data=request.data)
         if serializer.is_valid():
             comments = serializer.validated_data.get('comments', '')
-            obj.reject(request.user, comments)
+            try:
+                obj.reject(request.user, comments)
+            except ApprovalConflict as exc:
+                return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
             return Response({'message': 'Request rejected'})
         return Response(serializer.errors, status=400)
 
+    @action(detail=False, methods=['post'], url_path='bulk-approve', permission_classes=[IsAuthenticated, IsApprover])
+    def bulk_approve(self, request):
+        return self._bulk_decide(request, 'approve')
+
+    @action(detail=False, methods=['post'], url_path='bulk-reject', permission_classes=[IsAuthenticated, IsApprover])
+    def bulk_reject(self, request):
+        return self._bulk_decide(request, 'reject')
+
+    def _bulk_decide(self, request, decision):
+        serializer = BulkApprovalActionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
 
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        comments = serializer.validated_data.get('comments', '')
+        try:
+            decided = set(PurchaseRequest.objects.decide(request.user, ids, decision, comments))
+        except ApprovalConflict as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
+
+        outcome = 'approved' if decision == 'approve' else 'rejected'
+        results = [
+            {'id': request_id, 'result': outcome} if request_id in decided else
+            {'id': request_id, 'result': 'skipped', 'error': 'Not awaiting your approval'}
+            for request_id in ids
+        ]
+        return Response({'decided': len(decided), 'results': results})
+
+
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsApprover])
 def pending_approvals(request):
-    user = request.user
-    requests = PurchaseRequest.objects.filter(status='pending')
-
-    # Filter based on approval level
-    if user.role == 'approver_1':
-        # Can approve if no level 1 approval exists
-        requests = [r for r in requests if not r.approvals.filter(level=1).exists()]
-    elif user.role == 'approver_2':
-        # Can approve if level 1 is approved but level 2 is not
-        requests = [r for r in requests if
-                   r.approvals.filter(level=1, status='approved').exists() and
-                   not r.approvals.filter(level=2).exists()]
-
-    serializer = PurchaseRequestSerializer(requests, many=True)
-    return Response(serializer.data)
\ No newline at end of file
+    requests = PurchaseRequest.objects.awaiting_approval_by(request.user).with_list_relations()
+
+    # Paginate the same way the request list does: no COUNT(*), no OFFSET
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(requests, request)
+    serializer = PurchaseRequestSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
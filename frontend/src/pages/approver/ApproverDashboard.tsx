@@ -41,7 +41,7 @@ export const ApproverDashboard: React.FC = () => {
 
         // Fetch pending approvals for this approver
         const response = await axios.get('http://localhost:8000/api/approvals/pending/');
-        const apiRequests = response.data;
+        const apiRequests = response.data.results || response.data;
 
         // Transform data to match frontend interface
         const transformedRequests: RequestData[] = apiRequests.map((req: any, index: number) => ({
@@ -60,7 +60,7 @@ export const ApproverDashboard: React.FC = () => {
         setFilteredRequests(transformedRequests);
 
         // Calculate stats
-        const pendingCount = transformedRequests.length;
+        const pendingCount = response.data.count ?? transformedRequests.length;
         const approvedCount = 0; // This dashboard only shows pending requests
         const rejectedCount = 0;
         const urgentCount = 0; // Could be calculated based on amount thresholds